@@ -0,0 +1,153 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Measure the cost of the contexts of the no product engine: time, garbage
+collector runs and time, per million elements, and allocations: the peak
+of the memory blocks allocated while feeding (a second run, sampled at
+every record) and the peak of the memory traced by `tracemalloc` (a third
+run).
+
+    python benchmarks/bench_contexts.py [--elements N] [--pool-sizes 0 1024]
+
+The handler is fed with synthetic SAX events (records of eight leaves),
+so that the parser does not hide the cost of the contexts.
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "xml2csv"))
+
+from xml.sax.xmlreader import AttributesImpl  # noqa: E402
+
+from sax import NoProductHandler, POOL_SIZE  # noqa: E402
+
+LEAVES = ["leaf{}".format(i) for i in range(8)]
+NO_ATTRS = AttributesImpl({})
+
+
+class NullWriter:
+    def writerow(self, _row):
+        pass
+
+
+class GcTimer:
+    def __init__(self):
+        self.collections = 0
+        self.elapsed = 0.0
+        self._start = None
+
+    def __call__(self, phase, _info):
+        if phase == "start":
+            self._start = time.perf_counter()
+        else:
+            self.collections += 1
+            self.elapsed += time.perf_counter() - self._start
+
+
+class BlocksCounter:
+    """
+    The peak of the memory blocks allocated above the start.
+    """
+
+    def __init__(self):
+        self._start = sys.getallocatedblocks()
+        self.peak = 0
+
+    def __call__(self):
+        blocks = sys.getallocatedblocks() - self._start
+        if blocks > self.peak:
+            self.peak = blocks
+
+
+def feed(handler: NoProductHandler, elements: int, on_record=None):
+    records = elements // (len(LEAVES) + 1)
+    handler.startElement("root", NO_ATTRS)
+    for i in range(records):
+        handler.startElement("record", AttributesImpl({"id": str(i)}))
+        for leaf in LEAVES:
+            handler.startElement(leaf, NO_ATTRS)
+            handler.characters("value")
+            handler.endElement(leaf)
+        handler.endElement("record")
+        if on_record is not None:
+            on_record()
+    handler.endElement("root")
+
+
+def create_handler(pool_size: int) -> NoProductHandler:
+    columns = [("root", "record", "@id")] + [
+        ("root", "record", leaf, "^text") for leaf in LEAVES]
+    return NoProductHandler(NullWriter(), columns, pool_size=pool_size)
+
+
+def allocated_blocks(elements: int, pool_size: int) -> int:
+    handler = create_handler(pool_size)
+    gc.collect()
+    counter = BlocksCounter()
+    feed(handler, elements, counter)
+    return counter.peak
+
+
+def traced_peak(elements: int, pool_size: int) -> int:
+    handler = create_handler(pool_size)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        feed(handler, elements)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench(elements: int, pool_size: int):
+    handler = create_handler(pool_size)
+    timer = GcTimer()
+    gc.collect()
+    gc.callbacks.append(timer)
+    try:
+        start = time.perf_counter()
+        feed(handler, elements)
+        elapsed = time.perf_counter() - start
+    finally:
+        gc.callbacks.remove(timer)
+    scale = 1000000 / elements
+    print("pool_size={:<6} {:8.3f} s  {:8.0f} gc runs  {:8.3f} s in gc"
+          "  (per million elements)".format(
+              pool_size, elapsed * scale, timer.collections * scale,
+              timer.elapsed * scale))
+    print("pool_size={:<6} {:8d} blocks at peak  {:8.1f} KiB traced at "
+          "peak".format(pool_size, allocated_blocks(elements, pool_size),
+                        traced_peak(elements, pool_size) / 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--elements", type=int, default=1000000)
+    parser.add_argument("--pool-sizes", type=int, nargs="+",
+                        default=[0, POOL_SIZE])
+    args = parser.parse_args()
+    for pool_size in args.pool_sizes:
+        bench(args.elements, pool_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import asyncio
+import unittest
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from io import StringIO
+
+from xml2csv.aio import aiter_rows
+from xml2csv.main import xml2csv
+
+XML = b"""<root>
+    <foo>
+        <bar>bar1</bar>
+        <bar>bar2</bar>
+        <baz>baz1</baz>
+    </foo>
+    <foo>
+        <baz>baz2</baz>
+    </foo>
+</root>"""
+
+
+async def _source(data, size=7):
+    for i in range(0, len(data), size):
+        await asyncio.sleep(0)
+        yield data[i:i + size]
+
+
+async def _collect(batches):
+    return [row async for batch in batches for row in batch]
+
+
+class TestAiterRows(unittest.TestCase):
+    def test_no_product(self):
+        rows = asyncio.run(_collect(aiter_rows(
+            _source(XML), short_names=True, product=False)))
+        self.assertEqual([['root.#num', 'foo.#num', 'bar.#num', 'bar.^text',
+                           'baz.#num', 'baz.^text'],
+                          [0, 0, 0, 'bar1', 0, 'baz1'],
+                          [0, 0, 1, 'bar2', 0, 'baz1'],
+                          [0, 1, '', '', 0, 'baz2']], rows)
+
+    def test_no_product_columns(self):
+        columns = [('root', 'foo', 'bar', '^text'),
+                   ('root', 'foo', 'baz', '^text')]
+
+        async def batches():
+            return [batch async for batch in aiter_rows(
+                _source(XML, 40), columns=columns, product=False)]
+
+        batches = asyncio.run(batches())
+        self.assertEqual([['root.foo.bar.^text', 'root.foo.baz.^text']],
+                         batches[0])
+        self.assertEqual([['bar1', 'baz1'], ['bar2', 'baz1'], ['', 'baz2']],
+                         [row for batch in batches[1:] for row in batch])
+        self.assertTrue(len(batches) > 2)
+
+    def test_product_executor(self):
+        with ThreadPoolExecutor(1) as executor:
+            rows = asyncio.run(_collect(aiter_rows(
+                _source(XML), short_names=True, executor=executor,
+                batch_size=1)))
+        self.assertEqual([['root.#num', 'foo.#num', 'bar.#num', 'bar.^text',
+                           'baz.#num', 'baz.^text'],
+                          [0, 0, 0, 'bar1', 0, 'baz1'],
+                          [0, 0, 1, 'bar2', 0, 'baz1'],
+                          [0, 1, '', '', 0, 'baz2']], rows)
+
+    def test_defaults(self):
+        out = StringIO()
+        xml2csv(StringIO(XML.decode("utf-8")), out, lineterminator="\n")
+        rows = asyncio.run(_collect(aiter_rows(_source(XML))))
+        self.assertEqual(out.getvalue(), "".join(
+            ",".join(str(value) for value in row) + "\n" for row in rows))
+
+    def test_product_header_in_executor(self):
+        functions = []
+
+        class RecordingExecutor(ThreadPoolExecutor):
+            def submit(self, fn, *args, **kwargs):
+                functions.append(fn)
+                return super().submit(fn, *args, **kwargs)
+
+        with RecordingExecutor(1) as executor:
+            asyncio.run(_collect(aiter_rows(_source(XML),
+                                            executor=executor)))
+        self.assertIn(next, functions)
+
+    def test_no_product_batch_size(self):
+        async def batches():
+            return [batch async for batch in aiter_rows(
+                _source(XML, len(XML)), product=False, batch_size=2)]
+
+        batches = asyncio.run(batches())
+        self.assertEqual([1, 2, 1], [len(batch) for batch in batches])
+
+    def test_process_pool(self):
+        with ProcessPoolExecutor(1) as executor:
+            with self.assertRaises(ValueError):
+                asyncio.run(_collect(aiter_rows(_source(XML),
+                                                executor=executor)))
+
+
+if __name__ == "__main__":
+    unittest.main()
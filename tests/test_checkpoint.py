@@ -0,0 +1,117 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import csv
+import os
+import tempfile
+import unittest
+
+from xml2csv.checkpoint import CheckpointedFlattener
+from xml2csv.main import xml2csv
+from xml2csv.progress import Progress
+
+
+class Crash(Exception):
+    pass
+
+
+class CrashingWriter:
+    def __init__(self, writer, rows: int):
+        self._writer = writer
+        self._rows = rows
+
+    def writerow(self, row):
+        if self._rows == 0:
+            raise Crash()
+        self._rows -= 1
+        self._writer.writerow(row)
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.xml_path = self._path("example.xml")
+        with open(self.xml_path, "w", encoding="utf-8") as f:
+            f.write('<?xml version="1.0"?>\n<root date="2021">\n')
+            for i in range(50):
+                f.write('  <record id="{}"><name>é{}</name>'.format(i, i))
+                for j in range(i % 3):
+                    f.write('<tag>t{}</tag>'.format(j))
+                f.write('</record>\n')
+            f.write('</root>\n')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def _read(self, name):
+        with open(self._path(name), encoding="utf-8") as f:
+            return f.read()
+
+    def test_resume(self):
+        with open(self._path("expected.csv"), "w", newline="",
+                  encoding="utf-8") as out:
+            xml2csv(self.xml_path, out, product=False)
+
+        checkpoint_path = self._path("checkpoint")
+        flattener = CheckpointedFlattener(self.xml_path, checkpoint_path, 10,
+                                          number_cols=True)
+        with open(self._path("out.csv"), "w", newline="",
+                  encoding="utf-8") as out:
+            writer = CrashingWriter(csv.writer(out), 35)
+            with self.assertRaises(Crash):
+                flattener.flatten(writer, out)
+        self.assertTrue(os.path.exists(checkpoint_path))
+
+        with open(self._path("out.csv"), "r+", newline="",
+                  encoding="utf-8") as out:
+            flattener.flatten(csv.writer(out), out, resume=True)
+        self.assertFalse(os.path.exists(checkpoint_path))
+        self.assertEqual(self._read("expected.csv"), self._read("out.csv"))
+
+    def test_resume_without_checkpoint(self):
+        with open(self._path("expected.csv"), "w", newline="",
+                  encoding="utf-8") as out:
+            xml2csv(self.xml_path, out, product=False)
+        with open(self._path("out.csv"), "w", newline="",
+                  encoding="utf-8") as out:
+            out.write("stale\n" * 1000)
+        with open(self._path("out.csv"), "r+", newline="",
+                  encoding="utf-8") as out:
+            xml2csv(self.xml_path, out, product=False,
+                    checkpoint=self._path("checkpoint"), checkpoint_every=7,
+                    resume=True)
+        self.assertEqual(self._read("expected.csv"), self._read("out.csv"))
+
+    def test_progress(self):
+        progress = Progress(os.path.getsize(self.xml_path))
+        with open(self._path("out.csv"), "w", newline="",
+                  encoding="utf-8") as out:
+            xml2csv(self.xml_path, out, product=False,
+                    checkpoint=self._path("checkpoint"), progress=progress)
+        self.assertEqual(os.path.getsize(self.xml_path), progress.bytes_read)
+
+    def test_product(self):
+        with self.assertRaises(ValueError):
+            xml2csv(self.xml_path, product=True,
+                    checkpoint=self._path("checkpoint"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import unittest
+from io import StringIO
+from unittest import mock
+from xml.etree import ElementTree as ET
+
+from xml2csv.columnar import to_columns, DictionaryColumn
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+XML = """<data>
+    <country name="Liechtenstein">
+        <rank>1</rank>
+        <gdppc>141100.5</gdppc>
+    </country>
+    <country name="Singapore">
+        <rank>4</rank>
+        <gdppc>59900</gdppc>
+    </country>
+</data>"""
+
+
+class TestColumnar(unittest.TestCase):
+    def test_product(self):
+        columns = to_columns(StringIO(XML), short_names=True)
+        self.assertEqual(['data.#num', 'country.#num', 'country.@name',
+                          'rank.#num', 'rank.^text', 'gdppc.#num',
+                          'gdppc.^text'], list(columns))
+        self.assertEqual([0, 1], list(columns['country.#num']))
+        self.assertEqual(['Liechtenstein', 'Singapore'],
+                         list(columns['country.@name']))
+        self.assertEqual([1, 4], list(columns['rank.^text']))
+        self.assertEqual([141100.5, 59900.0], list(columns['gdppc.^text']))
+
+    def test_one_parse(self):
+        with mock.patch.object(ET, "parse", wraps=ET.parse) as parse:
+            to_columns(StringIO(XML))
+        self.assertEqual(1, parse.call_count)
+
+    def test_no_product(self):
+        columns = to_columns(StringIO(XML), product=False, number_cols=False)
+        self.assertEqual({
+            'data.country.@name': ['Liechtenstein', 'Singapore'],
+            'data.country.rank.^text': [1, 4],
+            'data.country.gdppc.^text': [141100.5, 59900.0]
+        }, {k: list(v) for k, v in columns.items()})
+
+    def test_dictionary_encode(self):
+        for product in (True, False):
+            columns = to_columns(StringIO(XML), short_names=True,
+                                 product=product, dictionary_encode=True)
+            names = columns['country.@name']
+            self.assertIsInstance(names, DictionaryColumn)
+            self.assertEqual(['Liechtenstein', 'Singapore'],
+                             sorted(names.categories))
+            self.assertEqual(['Liechtenstein', 'Singapore'],
+                             [names.categories[c] for c in names.codes])
+            self.assertEqual(['Liechtenstein', 'Singapore'], list(names))
+            self.assertEqual([1, 4], list(columns['rank.^text']))
+
+    def test_strict_numbers(self):
+        for texts in (["1_000", "2"], ["nan", "1"], ["inf", "1.5"],
+                      ["0x10", "1"], ["1e", "1"]):
+            xml = "<a>{}</a>".format("".join(
+                "<b>{}</b>".format(t) for t in texts))
+            columns = to_columns(StringIO(xml), short_names=True,
+                                 product=False)
+            self.assertEqual(texts, list(columns["b.^text"]))
+        columns = to_columns(StringIO("<a><b>-1e3</b><b>+.5</b></a>"),
+                             short_names=True, product=False)
+        self.assertEqual([-1000.0, 0.5], list(columns["b.^text"]))
+
+    @unittest.skipUnless(np, "numpy is not installed")
+    def test_numpy_arrays(self):
+        xml = "<a><r><b>1</b><c>x</c></r><r><c>1.5</c></r></a>"
+        columns = to_columns(StringIO(xml), short_names=True, product=False)
+        self.assertEqual(np.int64, columns["r.#num"].dtype)
+        b = columns["b.^text"]
+        self.assertEqual(np.float64, b.dtype)  # a missing value
+        self.assertEqual(1.0, b[0])
+        self.assertTrue(np.isnan(b[1]))
+        self.assertEqual(object, columns["c.^text"].dtype)
+        self.assertEqual(["x", "1.5"], list(columns["c.^text"]))
+
+    @unittest.skipUnless(pd, "pandas is not installed")
+    def test_dataframe(self):
+        from xml2csv.columnar import to_dataframe
+
+        df = to_dataframe(StringIO(XML), short_names=True,
+                          dictionary_encode=True)
+        self.assertEqual(['data.#num', 'country.#num', 'country.@name',
+                          'rank.#num', 'rank.^text', 'gdppc.#num',
+                          'gdppc.^text'], list(df.columns))
+        self.assertEqual(2, len(df))
+        self.assertEqual("category", df["country.@name"].dtype.name)
+        self.assertEqual(['Liechtenstein', 'Singapore'],
+                         list(df["country.@name"]))
+        self.assertEqual([1, 4], list(df["rank.^text"]))
+
+    def test_duplicate_names(self):
+        with self.assertRaises(ValueError):
+            to_columns(StringIO("<a><b><c>1</c></b><c>2</c></a>"),
+                       short_names=True, number_cols=False)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import tempfile
+import unittest
+from io import StringIO
+
+from xml2csv.delta import DeltaFlattener
+from xml2csv.progress import Progress
+from xml2csv.sampling import REWRITE
+
+
+class MockWriter:
+    def __init__(self):
+        self.rows = []
+
+    def writerow(self, row):
+        self.rows.append(row)
+
+
+def feed(*records):
+    return StringIO("<root>\n{}\n</root>".format("\n".join(records)))
+
+
+class TestDelta(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.index_path = os.path.join(self.directory.name, "index.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _flatten(self, source, key=None, **kwargs):
+        writer = MockWriter()
+        flattener = DeltaFlattener(source, self.index_path, key,
+                                   short_names=True, number_cols=True,
+                                   **kwargs)
+        flattener.flatten(writer)
+        return flattener, writer.rows
+
+    def test_key(self):
+        flattener, rows = self._flatten(feed(
+            '<item id="a"><v>1</v></item>',
+            '<item id="b"><v>2</v><v>3</v></item>',
+            '<item id="c"><v>4</v></item>'), "id")
+        self.assertEqual(['op', 'key', 'root.#num', 'item.#num', 'item.@id',
+                          'v.#num', 'v.^text'], rows[0])
+        self.assertEqual([['insert', 'a', 0, 0, 'a', 0, '1'],
+                          ['insert', 'b', 0, 1, 'b', 0, '2'],
+                          ['insert', 'b', 0, 1, 'b', 1, '3'],
+                          ['insert', 'c', 0, 2, 'c', 0, '4']], rows[1:])
+        self.assertEqual(3, flattener.counts["insert"])
+
+        flattener, rows = self._flatten(feed(
+            '<item id="a"><v>1</v></item>',
+            '<item id="b"><v>2</v><v>5</v></item>',
+            '<item id="d"><v>6</v></item>'), "id")
+        self.assertEqual([['update', 'b', 0, 1, 'b', 0, '2'],
+                          ['update', 'b', 0, 1, 'b', 1, '5'],
+                          ['insert', 'd', 0, 2, 'd', 0, '6'],
+                          ['delete', 'c', '', '', '', '', '']], rows[1:])
+        self.assertEqual({"insert": 1, "update": 1, "delete": 1,
+                          "unchanged": 1}, flattener.counts)
+
+        _, rows = self._flatten(feed(
+            '<item id="a"><v>1</v></item>',
+            '<item id="b"><v>2</v><v>5</v></item>',
+            '<item id="d"><v>6</v></item>'), "id")
+        self.assertEqual(1, len(rows))
+
+    def test_position(self):
+        self._flatten(feed('<item><v>1</v></item>', '<item><v>2</v></item>'))
+        _, rows = self._flatten(feed('<item><v>1</v></item>',
+                                     '<item><v>3</v></item>'))
+        self.assertEqual([['update', '1', 0, 1, 0, '3']], rows[1:])
+
+    def test_moved_record(self):
+        a, b, z = ('<i id="{0}"><v>{0}</v></i>'.format(key)
+                   for key in "abz")
+        self._flatten(feed(a, b), "id")
+        _, rows = self._flatten(feed(z, a, b), "id")
+        self.assertEqual([['insert', 'z', 0, 0, 'z', 0, 'z'],
+                          ['update', 'a', 0, 1, 'a', 0, 'a'],
+                          ['update', 'b', 0, 2, 'b', 0, 'b']], rows[1:])
+
+        os.remove(self.index_path)
+        DeltaFlattener(feed(a, b), self.index_path, "id").flatten(
+            MockWriter())
+        writer = MockWriter()
+        DeltaFlattener(feed(z, a, b), self.index_path, "id").flatten(writer)
+        self.assertEqual([['insert', 'z', 'z', 'z']], writer.rows[1:])
+
+    def test_late_columns(self):
+        self._flatten(feed('<item id="a"><v>1</v></item>'), "id")
+        with self.assertRaises(ValueError):
+            self._flatten(feed('<item id="a"><v>1</v></item>',
+                               '<item id="b"><v>2</v><w>x</w></item>'), "id")
+        flattener, rows = self._flatten(
+            feed('<item id="a"><v>1</v></item>',
+                 '<item id="b"><v>2</v><w>x</w></item>'), "id",
+            policy=REWRITE)
+        self.assertEqual([['insert', 'b', 0, 1, 'b', 0, '2', 0, 'x']],
+                         rows[1:])
+        self.assertEqual([("root", "item", "w", "#num"),
+                          ("root", "item", "w", "^text")],
+                         flattener.late_columns)
+
+    def test_framed_hash(self):
+        self._flatten(feed('<r id="1"><a>x&gt;</a></r>'), "id")
+        flattener, rows = self._flatten(feed('<r id="1"><a>x</a>&gt;</r>'),
+                                        "id", policy=REWRITE)
+        self.assertEqual({"insert": 0, "update": 1, "unchanged": 0,
+                          "delete": 0}, flattener.counts)
+        self.assertEqual("update", rows[1][0])
+
+    def test_root_attributes(self):
+        self._flatten(StringIO('<root v="1"><item id="a"/></root>'), "id")
+        flattener, _ = self._flatten(
+            StringIO('<root v="2"><item id="a"/></root>'), "id")
+        self.assertEqual(1, flattener.counts["update"])
+        flattener, _ = self._flatten(
+            StringIO('<root v="2"><item id="a"/></root>'), "id")
+        self.assertEqual(1, flattener.counts["unchanged"])
+
+    def test_progress(self):
+        source = feed('<item id="a"/>', '<item id="b"/>')
+        size = len(source.getvalue())
+        progress = Progress(size)
+        self._flatten(source, "id", progress=progress)
+        self.assertEqual(size, progress.bytes_read)
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            self._flatten(feed('<item id="a"/>', '<item/>'), "id")
+        with self.assertRaises(ValueError):
+            self._flatten(feed('<item id="a"/>', '<item id="a"/>'), "id")
+        self._flatten(feed('<item id="a"/>'), "id")
+        with self.assertRaises(ValueError):
+            self._flatten(feed('<item id="a"/>'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import unittest
+from io import StringIO
+import xml.etree.ElementTree as ET
+
+from xml2csv.dom import ProductFlattener
+from xml2csv.interning import ColumnDictionary, ColumnDictionaries
+from xml2csv.main import xml2csv
+
+
+class MockWriter:
+    def __init__(self):
+        self.rows = []
+
+    def writerow(self, row):
+        self.rows.append(row)
+
+
+class TestInterning(unittest.TestCase):
+    def test_intern(self):
+        dictionary = ColumnDictionary()
+        first = "".join(["F", "R"])
+        second = "".join(["F", "R"])
+        self.assertIsNot(first, second)
+        self.assertIs(first, dictionary.intern(first))
+        self.assertIs(first, dictionary.intern(second))
+        self.assertEqual(0, dictionary.code(second))
+        self.assertIsNone(dictionary.code("DE"))
+
+    def test_bounded(self):
+        dictionary = ColumnDictionary(2)
+        for value in ("a", "b", "c", "a"):
+            dictionary.intern(value)
+        self.assertEqual(["a", "b"], dictionary.categories)
+        self.assertTrue(dictionary.overflowed)
+        self.assertIsNone(dictionary.code("c"))
+
+    def test_product_flattener(self):
+        root = ET.fromstring("""<root>
+    <item code="FR"><status> ok </status></item>
+    <item code="FR"><status>ok</status></item>
+</root>""")
+        dictionaries = ColumnDictionaries()
+        flattener = ProductFlattener(root, dictionaries=dictionaries)
+        rows = list(flattener.flatten())[1:]
+        self.assertEqual([["FR", "ok"], ["FR", "ok"]], rows)
+        self.assertIs(rows[0][0], rows[1][0])
+        self.assertIs(rows[0][1], rows[1][1])
+        self.assertEqual(["ok"], dictionaries[
+            ("root", "item", "status", "^text")].categories)
+        self.assertNotIn(("root", "item", "@id"), dictionaries)
+
+    def test_xml2csv(self):
+        xml = "<root>{}</root>".format("".join(
+            '<item code="FR{0}"><status>active</status><v>{0}</v></item>'
+            .format(i % 2) for i in range(4)))
+        for intern in (False, True):
+            writer = MockWriter()
+            xml2csv(StringIO(xml), writer=writer, number_cols=False,
+                    fast_path=False, intern=intern)
+            rows = writer.rows[1:]
+            self.assertEqual(["FR0", "active", "0"], rows[0])
+            self.assertEqual(rows[0], rows[2])
+            if intern:
+                self.assertIs(rows[0][0], rows[2][0])
+                self.assertIs(rows[0][1], rows[3][1])
+        with self.assertRaises(ValueError):
+            xml2csv(StringIO(xml), writer=MockWriter(), product=False,
+                    intern=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
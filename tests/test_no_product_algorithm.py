@@ -19,7 +19,9 @@
 import unittest
 from io import StringIO
 
-from xml2csv.sax import NoProductFlattener
+from xml.sax import make_parser
+
+from xml2csv.sax import NoProductFlattener, NoProductHandler, find_columns
 
 
 class MockWriter:
@@ -134,3 +136,37 @@ class TestNoProductAlgorithm(unittest.TestCase):
              [0, 'root', 1, '', '', '', '', '', '', 0, 0, '1'],
              [0, 'root', 1, '', '', '', '', '', '', 0, 1, '2'],
              [0, 'root', 1, '', '', '', 0, '', 'baz2', '', '', '']])
+
+    def test_rows(self):
+        flattener = NoProductFlattener(StringIO("""<root>
+    <foo>foo1</foo>
+    <foo>foo2</foo>
+    <bar>bar1</bar>
+    <bar>bar2</bar>
+</root>"""), short_names=True, number_cols=True)
+        rows = flattener.rows()
+        self.assertEqual(['root.#num', 'foo.#num', 'foo.^text', 'bar.#num',
+                          'bar.^text'], next(rows))
+        self.assertEqual([[0, 0, 'foo1', '', ''],
+                          [0, 1, 'foo2', '', ''],
+                          [0, '', '', 0, 'bar1'],
+                          [0, '', '', 1, 'bar2']], list(rows))
+
+    def test_pool(self):
+        xml = """<root>
+    <foo a="f"><bar>bar1</bar><bar>bar2</bar><baz>baz1</baz></foo>
+    <foo><baw>1</baw><baw>2</baw><baz>baz2</baz></foo>
+    <foo b="g"><bar>bar3</bar><baz>baz3</baz></foo>
+</root>"""
+        columns = find_columns(StringIO(xml), True)
+        rows_by_pool_size = {}
+        for pool_size in (0, 1, 1024):
+            writer = MockWriter()
+            parser = make_parser()
+            parser.setContentHandler(
+                NoProductHandler(writer, columns, pool_size=pool_size))
+            parser.parse(StringIO(xml))
+            rows_by_pool_size[pool_size] = writer.rows
+        self.assertEqual(5, len(rows_by_pool_size[0]))
+        self.assertEqual(rows_by_pool_size[0], rows_by_pool_size[1])
+        self.assertEqual(rows_by_pool_size[0], rows_by_pool_size[1024])
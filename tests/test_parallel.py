@@ -0,0 +1,59 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import tempfile
+import unittest
+
+from xml2csv import sax, parallel
+
+
+class TestParallel(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".xml")
+        with os.fdopen(fd, "w") as f:
+            f.write('<?xml version="1.0"?>\n<root r="1">\n')
+            for i in range(200):
+                f.write('<record id="{}">'.format(i))
+                f.write('<a>{}</a>'.format(i))
+                if i % 50 == 49:
+                    f.write('<late{} x="1"/>'.format(i))
+                if i % 70 == 0:
+                    f.write('<nested><record-like>1</record-like></nested>')
+                f.write('</record>\n')
+            f.write('</root>\n')
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_same_columns(self):
+        for number_cols in True, False:
+            self.assertEqual(sax.find_columns(self.path, number_cols),
+                             parallel.find_columns(self.path, number_cols, 4))
+
+    def test_merge_columns(self):
+        self.assertEqual([('r', '#num'), ('r', 'a', '^text'),
+                          ('r', 'b', '@x'), ('r', 'b', '^text')],
+                         parallel.merge_columns([
+                             {('r',): {'#num'}, ('r', 'a'): {'^text'}},
+                             {('r',): {'#num'}, ('r', 'b'): {'^text'},
+                              ('r', 'a'): {'^text'}},
+                             {('r', 'b'): {'@x'}}]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import csv
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import unittest
+from io import StringIO
+from xml.sax import SAXParseException
+
+from xml2csv.main import xml2csv
+from xml2csv.parts import PartWriter
+
+
+class TestPartWriter(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "out.csv")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _read(self, name, opener=open):
+        with opener(os.path.join(self.directory.name, name), "rt",
+                    newline="", encoding="utf-8") as f:
+            return list(csv.reader(f))
+
+    def test_split_rows(self):
+        with PartWriter(self.path, max_rows=2) as writer:
+            writer.writerow(["a", "b"])
+            writer.writerows([[i, i * 2] for i in range(5)])
+
+        self.assertEqual([["a", "b"], ["0", "0"], ["1", "2"]],
+                         self._read("out-00000.csv"))
+        self.assertEqual([["a", "b"], ["4", "8"]],
+                         self._read("out-00002.csv"))
+        with open(writer.manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.assertEqual(["a", "b"], manifest["header"])
+        self.assertTrue(manifest["complete"])
+        self.assertEqual([2, 2, 1], [p["rows"] for p in manifest["parts"]])
+        part_path = os.path.join(self.directory.name, "out-00001.csv")
+        with open(part_path, "rb") as f:
+            data = f.read()
+        self.assertEqual(hashlib.sha256(data).hexdigest(),
+                         manifest["parts"][1]["sha256"])
+        self.assertEqual(len(data), manifest["parts"][1]["bytes"])
+
+    def test_split_bytes(self):
+        writer = PartWriter(self.path, max_bytes=20)
+        writer.writerow(["header"])
+        writer.writerows([["x" * 8] for _ in range(5)])
+        entries = writer.close()
+        # a part is closed after the row that reaches the limit
+        self.assertEqual([2, 2, 1], [e["rows"] for e in entries])
+
+    def test_header_only(self):
+        with PartWriter(self.path, max_rows=2) as writer:
+            writer.writerow(["a", "b"])
+        self.assertEqual([["a", "b"]], self._read("out-00000.csv"))
+
+    def test_xml2csv_compress(self):
+        example = os.path.join(os.path.dirname(__file__), "examples",
+                               "example1.xml")
+        writer = PartWriter(self.path, max_rows=4, compress=True)
+        xml2csv(example, writer=writer)
+        entries = writer.close()
+
+        self.assertEqual(["out-00000.csv.gz", "out-00001.csv.gz"],
+                         [e["path"] for e in entries])
+        self.assertFalse(os.path.exists(
+            os.path.join(self.directory.name, "out-00000.csv")))
+        rows = self._read("out-00000.csv.gz", gzip.open)
+        rows += self._read("out-00001.csv.gz", gzip.open)[1:]
+        self.assertEqual(6, len(rows))
+        self.assertEqual("data.#num", rows[0][0])
+
+    def test_failure(self):
+        source = StringIO("<root><r><a>1</a></r><r><a>2</a></r>"
+                          "<r><a>3</a></r><r>")
+        with self.assertRaises(SAXParseException):
+            with PartWriter(self.path, max_rows=1) as writer:
+                xml2csv(source, writer=writer, product=False,
+                        columns=[("root", "r", "a", "^text")], fast_path=False)
+        with open(writer.manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.assertFalse(manifest["complete"])
+        self.assertEqual([1, 1, 1], [p["rows"] for p in manifest["parts"]])
+
+    def test_no_limit(self):
+        with self.assertRaises(ValueError):
+            PartWriter(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
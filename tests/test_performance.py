@@ -0,0 +1,162 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import unittest
+
+from xml2csv.main import xml2csv
+
+SMALL = 1000
+LARGE = 4 * SMALL
+# the no product engine: the peak memory of LARGE may exceed the peak
+# memory of SMALL by this ratio, plus a constant slack
+CONSTANT_MEMORY_RATIO = 1.5
+CONSTANT_MEMORY_SLACK = 256 * 1024
+# product mode: the peak memory ratio of LARGE to SMALL (ideally 4)
+LINEAR_MEMORY_RATIOS = (2, 6)
+# both engines: the maximum ratio of the function calls of LARGE to SMALL
+# (ideally 4): a deterministic measure of the work
+MAX_CALLS_RATIO = 4 * 1.25
+# both engines: the maximum wall time ratio of LARGE to SMALL (ideally 4),
+# checked only if this environment variable is set, since the wall time
+# depends on the load of the machine
+MAX_TIME_RATIO = 4 * 3
+BENCHMARK_ENV = "XML2CSV_BENCHMARK"
+
+
+class CountingWriter:
+    def __init__(self):
+        self.rows = 0
+
+    def writerow(self, _row):
+        self.rows += 1
+
+    def writerows(self, rows):
+        for _ in rows:
+            self.rows += 1
+
+
+def generate(path: str, count: int):
+    """
+    Write a document of `count` records, without cartesian product.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0"?>\n<root>\n')
+        for i in range(count):
+            f.write('  <record id="{0}"><name>name {0}</name>'
+                    '<value>{1}</value><tags><tag>a</tag><tag>b</tag></tags>'
+                    '</record>\n'.format(i, i * 3.5))
+        f.write('</root>\n')
+
+
+class TestPerformance(unittest.TestCase):
+    """
+    Check the scaling of the engines on generated documents of increasing
+    size. The tolerances are generous: these tests catch a change of
+    complexity, not a small slowdown.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.paths = {}
+        for count in (SMALL, LARGE):
+            path = os.path.join(cls.directory.name, "{}.xml".format(count))
+            generate(path, count)
+            cls.paths[count] = path
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def _convert(self, count: int, product: bool) -> int:
+        writer = CountingWriter()
+        xml2csv(self.paths[count], writer=writer, product=product,
+                fast_path=False)
+        return writer.rows
+
+    def _peak(self, count: int, product: bool) -> int:
+        self._convert(SMALL, product)  # warm up caches and imports
+        tracemalloc.start()
+        try:
+            self._convert(count, product)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def _calls(self, count: int, product: bool) -> int:
+        calls = 0
+
+        def profile(_frame, event, _arg):
+            nonlocal calls
+            if event in ("call", "c_call"):
+                calls += 1
+
+        sys.setprofile(profile)
+        try:
+            self._convert(count, product)
+        finally:
+            sys.setprofile(None)
+        return calls
+
+    def _elapsed(self, count: int, product: bool) -> float:
+        start = time.perf_counter()
+        self._convert(count, product)
+        return time.perf_counter() - start
+
+    def test_rows(self):
+        for product in (True, False):
+            small = self._convert(SMALL, product) - 1  # header
+            large = self._convert(LARGE, product) - 1
+            self.assertEqual(large, small * LARGE // SMALL)
+
+    def test_no_product_constant_memory(self):
+        small = self._peak(SMALL, False)
+        large = self._peak(LARGE, False)
+        self.assertLess(large,
+                        small * CONSTANT_MEMORY_RATIO + CONSTANT_MEMORY_SLACK)
+
+    def test_product_linear_memory(self):
+        small = self._peak(SMALL, True)
+        large = self._peak(LARGE, True)
+        low, high = LINEAR_MEMORY_RATIOS
+        self.assertGreater(large, small * low)
+        self.assertLess(large, small * high)
+
+    def test_linear_calls(self):
+        for product in (True, False):
+            self._convert(SMALL, product)
+            small = self._calls(SMALL, product)
+            large = self._calls(LARGE, product)
+            self.assertLess(large, small * MAX_CALLS_RATIO)
+
+    @unittest.skipUnless(os.environ.get(BENCHMARK_ENV),
+                         "set {} to check the wall time".format(BENCHMARK_ENV))
+    def test_linear_time(self):
+        for product in (True, False):
+            self._convert(SMALL, product)
+            small = self._elapsed(SMALL, product)
+            large = self._elapsed(LARGE, product)
+            self.assertLess(large, small * MAX_TIME_RATIO)
+
+
+if __name__ == "__main__":
+    unittest.main()
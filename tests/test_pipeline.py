@@ -0,0 +1,79 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import unittest
+from io import StringIO
+
+from xml2csv.main import xml2csv
+from xml2csv.pipeline import Pipeline, THREADS, PROCESSES
+from xml2csv.progress import Progress
+
+EXAMPLE = os.path.join(os.path.dirname(__file__), "examples", "example1.xml")
+
+
+class TestPipeline(unittest.TestCase):
+    def _convert(self, **kwargs) -> str:
+        out = StringIO()
+        xml2csv(EXAMPLE, out, fast_path=False, **kwargs)
+        return out.getvalue()
+
+    def test_same_output(self):
+        for product in (True, False):
+            expected = self._convert(product=product)
+            for mode in (THREADS, PROCESSES):
+                self.assertEqual(expected, self._convert(product=product,
+                                                         pipeline=mode))
+
+    def test_string_io(self):
+        with open(EXAMPLE, encoding="utf-8") as f:
+            text = f.read()
+        batches = list(Pipeline(THREADS).row_batches(
+            StringIO(text), number_cols=True))
+        self.assertEqual("data.#num", batches[0][0][0])
+        self.assertEqual(6, sum(len(batch) for batch in batches))
+
+    def test_error(self):
+        for mode in (THREADS, PROCESSES):
+            for product in (True, False):
+                with self.assertRaises(Exception):
+                    list(Pipeline(mode).row_batches(
+                        __file__, [("a",)], product=product))
+
+    def test_stop(self):
+        pipeline = Pipeline(THREADS, batch_size=1, queue_size=1)
+        batches = pipeline.row_batches(EXAMPLE, product=True)
+        next(batches)
+        batches.close()
+
+    def test_progress(self):
+        size = os.path.getsize(EXAMPLE)
+        for mode in (THREADS, PROCESSES):
+            for product in (True, False):
+                progress = Progress(size)
+                self._convert(product=product, pipeline=mode,
+                              progress=progress)
+                self.assertEqual(size, progress.bytes_read)
+                self.assertEqual(6, progress.rows)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            Pipeline("fibers")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -89,6 +89,25 @@ class TestProductAlgorithm(unittest.TestCase):
              [0, 1, '', '', 0, 'baz2'],
              ])
 
+    def test_interleaved_aliases(self):
+        self._flatten_is_equal("""<root>
+    <foo>foo1</foo>
+    <bar>bar1</bar>
+    <foo>foo2</foo>
+</root>""", [['root.#num', 'foo.#num', 'foo.^text', 'bar.#num', 'bar.^text'],
+             [0, 0, 'foo1', '', ''],
+             [0, 1, 'foo2', '', ''],
+             [0, '', '', 0, 'bar1']], aliases={'bar': 'foo'})
+
+    def test_same_path_different_shapes(self):
+        self._flatten_is_equal("""<root>
+    <foo a="1"><bar>bar1</bar></foo>
+    <foo b="2"><baz>baz1</baz><bar>bar2</bar></foo>
+</root>""", [['root.#num', 'foo.#num', 'foo.@a', 'foo.@b', 'bar.#num',
+              'bar.^text', 'baz.#num', 'baz.^text'],
+             [0, 0, '1', '', 0, 'bar1', '', ''],
+             [0, 1, '', '2', 0, 'bar2', 0, 'baz1']])
+
     def _flatten_is_equal(self, xml, expected, aliases=None):
         root = ET.fromstring(xml)
         flattener = ProductFlattener(root, short_names=True, number_cols=True,
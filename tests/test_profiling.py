@@ -0,0 +1,72 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import unittest
+from io import StringIO
+
+from xml2csv.main import xml2csv
+from xml2csv.profiling import Profile
+
+EXAMPLE = os.path.join(os.path.dirname(__file__), "examples", "example1.xml")
+
+
+class TestProfiling(unittest.TestCase):
+    def _profile(self, product: bool) -> Profile:
+        profile = Profile()
+        out = StringIO()
+        xml2csv(EXAMPLE, out, product=product, profile=profile)
+        expected = StringIO()
+        xml2csv(EXAMPLE, expected, product=product)
+        self.assertEqual(expected.getvalue(), out.getvalue())
+        return profile
+
+    def test_product(self):
+        profile = self._profile(True)
+        country = profile.stats_by_path[("data", "country")]
+        self.assertEqual(3, country.count)
+        self.assertEqual(5, country.rows)
+        self.assertEqual(2, country.fan_out)
+        self.assertEqual(3, profile.stats_by_path[
+            ("data", "country", "rank")].count)
+        self.assertEqual(5, profile.stats_by_path[("data",)].rows)
+
+    def test_no_product(self):
+        profile = self._profile(False)
+        self.assertEqual(5, profile.stats_by_path[
+            ("data", "country", "neighbor")].count)
+        self.assertEqual(5, sum(s.rows for s in
+                                profile.stats_by_path.values()))
+        self.assertGreater(profile.stats_by_path[
+            ("data", "country", "year")].text_bytes, 0)
+
+    def test_formats(self):
+        profile = self._profile(True)
+        out = StringIO()
+        profile.write(out, "table")
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith("path"))
+        self.assertEqual(7, len(lines))
+        out = StringIO()
+        profile.write(out, "folded")
+        self.assertIn("data;country;neighbor ", out.getvalue())
+        with self.assertRaises(ValueError):
+            profile.write(out, "svg")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import unittest
+from io import StringIO
+
+from xml2csv.main import xml2csv
+from xml2csv.progress import Progress
+
+EXAMPLE = os.path.join(os.path.dirname(__file__), "examples", "example1.xml")
+
+
+class Stop(Exception):
+    pass
+
+
+class TestProgress(unittest.TestCase):
+    def test_snapshots(self):
+        for product in True, False:
+            snapshots = []
+            progress = Progress(os.path.getsize(EXAMPLE), snapshots.append, 0)
+            xml2csv(EXAMPLE, StringIO(), product=product, progress=progress)
+            last = snapshots[-1]
+            self.assertEqual(os.path.getsize(EXAMPLE), last["bytes"])
+            self.assertEqual(6, last["rows"])
+            self.assertEqual(0, last["eta"])
+            self.assertEqual(2 if product else None, last["fan_out"])
+
+    def test_stop(self):
+        def callback(snapshot):
+            if snapshot["rows"] >= 2:
+                raise Stop()
+
+        progress = Progress(callback=callback, interval=0)
+        with self.assertRaises(Stop):
+            xml2csv(EXAMPLE, StringIO(), product=False, fast_path=False,
+                    progress=progress)
+
+    def test_stop_product(self):
+        xml = "<root><r>{}{}</r></root>".format("<a>1</a>" * 100,
+                                                 "<b>2</b>" * 100)
+        snapshots = []
+
+        def callback(snapshot):
+            snapshots.append(snapshot)
+            if (snapshot["fan_out"] or 0) > 1000:
+                raise Stop()
+
+        progress = Progress(callback=callback, interval=3600)
+        with self.assertRaises(Stop):
+            xml2csv(StringIO(xml), StringIO(), fast_path=False,
+                    progress=progress)
+        self.assertEqual(10000, snapshots[-1]["fan_out"])
+        self.assertEqual(1, snapshots[-1]["rows"])  # the header
+
+    def test_check(self):
+        snapshots = []
+        progress = Progress(callback=snapshots.append, interval=0)
+        progress.check()
+        self.assertEqual(1, len(snapshots))
+        progress = Progress(callback=snapshots.append, interval=3600)
+        progress.check()
+        self.assertEqual(1, len(snapshots))
+
+    def test_count_rows(self):
+        progress = Progress()
+        progress.add_rows(3)
+        progress.add_bytes(1024 * 1024)
+        snapshot = progress.snapshot()
+        self.assertEqual(3, snapshot["rows"])
+        self.assertEqual(1024 * 1024, snapshot["bytes"])
+        self.assertIsNone(snapshot["eta"])
+
+
+if __name__ == "__main__":
+    unittest.main()
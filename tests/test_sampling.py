@@ -0,0 +1,93 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import csv
+import os
+import tempfile
+import unittest
+from io import StringIO
+
+from xml2csv.main import xml2csv
+from xml2csv.sampling import (sample_columns, SamplingFlattener, SIDE,
+                              REWRITE, rewrite_header)
+
+XML = """<root>
+    <item><a>1</a></item>
+    <item><a>2</a></item>
+    <item><a>3</a><b>late</b></item>
+    <item><a>4</a></item>
+</root>"""
+
+
+class MockWriter:
+    def __init__(self):
+        self.rows = []
+
+    def writerow(self, row):
+        self.rows.append(row)
+
+
+class TestSampling(unittest.TestCase):
+    def test_sample_columns(self):
+        self.assertEqual([('root', 'item', 'a', '^text')],
+                         sample_columns(StringIO(XML), 2))
+        self.assertEqual([('root', 'item', 'a', '^text'),
+                          ('root', 'item', 'b', '^text')],
+                         sample_columns(StringIO(XML), 3))
+
+    def test_append(self):
+        writer = MockWriter()
+        flattener = SamplingFlattener(StringIO(XML), 2, short_names=True)
+        flattener.flatten(writer)
+        self.assertEqual([['a.^text'], ['1'], ['2'], ['3', 'late'], ['4', '']],
+                         writer.rows)
+        self.assertEqual([('root', 'item', 'b', '^text')],
+                         flattener.late_columns)
+
+    def test_side(self):
+        writer = MockWriter()
+        side_writer = MockWriter()
+        flattener = SamplingFlattener(StringIO(XML), 2, SIDE, side_writer,
+                                      short_names=True)
+        flattener.flatten(writer)
+        self.assertEqual([['a.^text'], ['1'], ['2'], ['3'], ['4']],
+                         writer.rows)
+        self.assertEqual([[2, 'root.item.b.^text', 'late']],
+                         side_writer.rows)
+
+    def test_rewrite_needs_a_file(self):
+        out = StringIO()
+        with self.assertRaises(ValueError):
+            xml2csv(StringIO(XML), out, product=False, sample_size=2,
+                    late_columns=REWRITE)
+        self.assertEqual("", out.getvalue())
+
+    def test_rewrite_header(self):
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        try:
+            with os.fdopen(fd, "w", newline="") as f:
+                csv.writer(f).writerows([["a"], ["1"], ["3", "late"]])
+            rewrite_header(path, ["a", "b"])
+            with open(path, newline="") as f:
+                self.assertEqual([["a", "b"], ["1", ""], ["3", "late"]],
+                                 list(csv.reader(f)))
+        finally:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
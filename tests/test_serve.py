@@ -0,0 +1,129 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import tempfile
+import unittest
+from io import StringIO
+
+from xml2csv.serve import Server
+
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".xml")
+        with os.fdopen(fd, "w") as f:
+            f.write("""<root>
+    <foo>foo1</foo>
+    <foo>foo2</foo>
+    <bar>bar1</bar>
+</root>""")
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_requests(self):
+        server = Server()
+        out = StringIO()
+        server.serve(StringIO("-s {0}\n-s -p -n {0}\n".format(self.path)),
+                     out)
+        expected1 = ("root.#num\tfoo.#num\tfoo.^text\tbar.#num\tbar.^text\r\n"
+                     "0\t0\tfoo1\t0\tbar1\r\n"
+                     "0\t1\tfoo2\t0\tbar1\r\n")
+        expected2 = "foo.^text\tbar.^text\r\nfoo1\tbar1\r\nfoo2\tbar1\r\n"
+        self.assertEqual(
+            "{}\n{}0\n{}\n{}0\n".format(len(expected1), expected1,
+                                        len(expected2), expected2),
+            out.getvalue())
+
+    def test_cached_columns(self):
+        server = Server()
+        server.serve(StringIO("{}\n".format(self.path)), StringIO())
+        self.assertEqual(1, len(server._columns_by_key))
+        server.serve(StringIO("{}\n".format(self.path)), StringIO())
+        self.assertEqual(1, len(server._columns_by_key))
+
+    def test_cached_schemas(self):
+        fd, xsd_path = tempfile.mkstemp(suffix=".xsd")
+        with os.fdopen(fd, "w") as f:
+            f.write("""<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema">
+    <xs:element name="root">
+        <xs:complexType>
+            <xs:sequence>
+                <xs:element name="foo" type="xs:string" maxOccurs="2"/>
+                <xs:element name="bar" type="xs:string"/>
+            </xs:sequence>
+        </xs:complexType>
+    </xs:element>
+</xs:schema>""")
+        try:
+            server = Server()
+            out = StringIO()
+            server.serve(StringIO("-s -x {0} {1}\n-s {1}\n".format(
+                xsd_path, self.path)), out)
+            responses = out.getvalue().split("0\n")
+            self.assertEqual(responses[0], responses[1])
+            schema = server._schema(xsd_path, True)
+            server.serve(StringIO("-s -x {} {}\n".format(
+                xsd_path, self.path)), StringIO())
+            self.assertIs(schema, server._schema(xsd_path, True))
+            self.assertEqual(1, len(server._schemas_by_key))
+        finally:
+            os.remove(xsd_path)
+
+    def test_jobs(self):
+        outs = []
+        for request in ("-s -p {}\n", "-s -p -j 2 {}\n"):
+            out = StringIO()
+            Server().serve(StringIO(request.format(self.path)), out)
+            outs.append(out.getvalue())
+        self.assertFalse(outs[0].startswith("!"))
+        self.assertEqual(outs[0], outs[1])
+
+    def test_options(self):
+        out = StringIO()
+        Server().serve(StringIO(
+            "-s -p -n --where 'foo == foo2' {}\n".format(self.path)), out)
+        expected = "foo.^text\tbar.^text\r\nfoo2\t\r\n"
+        self.assertEqual("{}\n{}0\n".format(len(expected), expected),
+                         out.getvalue())
+
+    def test_unsupported_options(self):
+        for request in ("-h", "-o out.csv {}", "--profile table {}",
+                        "--unknown {}"):
+            out = StringIO()
+            Server().serve(StringIO(request.format(self.path) + "\n"), out)
+            self.assertTrue(out.getvalue().startswith("!"), request)
+            self.assertEqual(1, out.getvalue().count("\n"), request)
+
+    def test_frame_length_in_bytes(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("<root><foo>\u00e9t\u00e9</foo></root>")
+        out = StringIO()
+        Server().serve(StringIO("-s -n {}\n".format(self.path)), out)
+        length, data = out.getvalue().split("\n", 1)
+        self.assertEqual(int(length), len(data[:-2].encode("utf-8")))
+
+    def test_error(self):
+        out = StringIO()
+        Server().serve(
+            StringIO("-a \"{{'a': 'b'}}\" -p {}\n".format(self.path)), out)
+        self.assertTrue(out.getvalue().startswith("!"))
+
+
+if __name__ == "__main__":
+    unittest.main()
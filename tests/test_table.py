@@ -0,0 +1,121 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import random
+import unittest
+from io import StringIO
+
+from xml2csv.main import xml2csv
+from xml2csv.table import find_table_columns
+
+TABLE = """<root r="1">
+    <record id="a">
+        <foo>foo1</foo>
+        <bar x="y">bar1</bar>
+    </record>
+    <record id="b">
+        <baz>baz2</baz>
+        <foo/>
+    </record>
+</root>"""
+
+
+def random_attrs(rnd: random.Random) -> str:
+    return "".join(' {}="{}"'.format(name, rnd.randint(0, 9))
+                   for name in rnd.sample("xyz", rnd.randint(0, 2)))
+
+
+def random_document(rnd: random.Random) -> str:
+    """
+    :return: a document shaped like a table, or a document that breaks
+             the shape at a random place
+    """
+    records = []
+    for _ in range(rnd.randint(1, 4)):
+        fields = []
+        for tag in rnd.sample("abcd", rnd.randint(0, 4)):
+            text = rnd.choice(["", " ", "v{}".format(rnd.randint(0, 9))])
+            fields.append("<{0}{1}>{2}</{0}>".format(tag, random_attrs(rnd),
+                                                     text))
+        records.append("<r{}>{}</r>".format(random_attrs(rnd),
+                                            "".join(fields)))
+    breaker = rnd.choice(["", "", "", "<r><a>1</a><a>2</a></r>",
+                          "<s><a>1</a></s>", "<r><a><b>1</b></a></r>"])
+    records.insert(rnd.randint(0, len(records)), breaker)
+    return "<root{}>{}</root>".format(random_attrs(rnd), "".join(records))
+
+
+class TestTable(unittest.TestCase):
+    def test_find_table_columns(self):
+        self.assertEqual([('root', '@r'), ('root', 'record', '@id'),
+                          ('root', 'record', 'foo', '^text'),
+                          ('root', 'record', 'bar', '@x'),
+                          ('root', 'record', 'bar', '^text'),
+                          ('root', 'record', 'baz', '^text')],
+                         find_table_columns(StringIO(TABLE)))
+
+    def test_not_a_table(self):
+        for xml in ["<root><a><b>1</b><b>2</b></a></root>",
+                    "<root><a><b>1</b></a><c><b>2</b></c></root>",
+                    "<root><a><b><c>1</c></b></a></root>",
+                    "<root><a>text<b>1</b></a></root>",
+                    "<root><a><b>1</b></a><a/></root>",
+                    "<root/>"]:
+            self.assertIsNone(find_table_columns(StringIO(xml)), xml)
+
+    def test_same_output(self):
+        rnd = random.Random(30)
+        for i in range(300):
+            xml = random_document(rnd)
+            for product in True, False:
+                for number_cols in True, False:
+                    expected = StringIO()
+                    xml2csv(StringIO(xml), expected, product=product,
+                            number_cols=number_cols, fast_path=False)
+                    actual = StringIO()
+                    xml2csv(StringIO(xml), actual, product=product,
+                            number_cols=number_cols)
+                    self.assertEqual(expected.getvalue(), actual.getvalue(),
+                                     (xml, product, number_cols))
+
+    def test_unknown_attribute(self):
+        out = StringIO()
+        xml2csv(StringIO('<root><rec id="1" x="2"><a y="3">v</a></rec>'
+                         '</root>'), out, product=False,
+                columns=[("root", "rec", "a", "^text")], fast_path=True)
+        self.assertEqual("root.rec.a.^text\r\nv\r\n", out.getvalue())
+
+    def test_not_a_table_with_fast_path(self):
+        columns = [("root", "rec", "a", "^text")]
+        for xml in ("<root><rec><a>1</a><a>2</a></rec></root>",
+                    "<root><rec><a><b>1</b></a></rec></root>"):
+            with self.assertRaises(ValueError):
+                xml2csv(StringIO(xml), StringIO(), columns=columns,
+                        fast_path=True)
+
+    def test_output(self):
+        out = StringIO()
+        xml2csv(StringIO(TABLE), out, short_names=True, fast_path=True)
+        self.assertEqual(
+            "root.#num,root.@r,record.#num,record.@id,foo.#num,foo.^text,"
+            "bar.#num,bar.@x,bar.^text,baz.#num,baz.^text\r\n"
+            "0,1,0,a,0,foo1,0,y,bar1,,\r\n"
+            "0,1,1,b,0,,,,,0,baz2\r\n", out.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import csv
+import hashlib
+import os
+import tempfile
+import unittest
+from io import StringIO
+
+from xml2csv.main import xml2csv
+from xml2csv.textpolicy import TextPolicy, TRUNCATE, HASH, SPILL
+
+BLOB = "QUJD" * 1000
+
+
+def convert(xml, product, text_policy):
+    out = StringIO()
+    xml2csv(StringIO(xml), out, product=product, text_policy=text_policy)
+    return list(csv.reader(StringIO(out.getvalue())))
+
+
+class TestTextBuffer(unittest.TestCase):
+    def feed(self, policy, chunks):
+        buffer = policy.new_buffer()
+        for chunk in chunks:
+            buffer.append(chunk)
+        return buffer.pop_value()
+
+    def test_short_text(self):
+        policy = TextPolicy(10, HASH)
+        self.assertEqual("a b", self.feed(policy, ["  ", " a", " ", "b  "]))
+        self.assertFalse(policy.new_buffer())
+
+    def test_truncate(self):
+        policy = TextPolicy(5, TRUNCATE)
+        self.assertEqual("abcde", self.feed(policy, [" ab", "cdef", "gh "]))
+
+    def test_hash(self):
+        policy = TextPolicy(5, HASH)
+        expected = "sha256:" + hashlib.sha256(b"ab cdef  gh").hexdigest()
+        self.assertEqual(expected, self.feed(
+            policy, ["\n ab", " cdef", "  ", "gh", "\n"]))
+        self.assertEqual(expected, policy.apply("\n ab cdef  gh\n"))
+
+    def test_spill(self):
+        with tempfile.TemporaryDirectory() as spill_dir:
+            policy = TextPolicy(3, SPILL, spill_dir)
+            path = self.feed(policy, [" abc", "def "])
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual("abcdef", f.read())
+            self.assertEqual("xy", self.feed(policy, ["xy"]))
+
+            buffer = policy.new_buffer()
+            buffer.append("abcdef")
+            buffer.clear()
+            self.assertEqual([os.path.basename(path)], os.listdir(spill_dir))
+
+    def test_spill_needs_dir(self):
+        with self.assertRaises(ValueError):
+            TextPolicy(3, SPILL)
+        with self.assertRaises(ValueError):
+            TextPolicy(3, "drop")
+
+
+class TestTextPolicy(unittest.TestCase):
+    def test_conversion(self):
+        xml = "<root><a><b>{}</b><c>1</c><c>2</c></a></root>".format(BLOB)
+        for product in (True, False):
+            rows = convert(xml, product, TextPolicy(8, TRUNCATE))
+            self.assertEqual(BLOB[:8], rows[1][rows[0].index("root.a.b.^text")])
+
+            rows = convert(xml, product, TextPolicy(8, HASH))
+            expected = "sha256:" + hashlib.sha256(BLOB.encode()).hexdigest()
+            self.assertEqual(expected, rows[1][rows[0].index("root.a.b.^text")])
+
+    def test_spill_conversion(self):
+        xml = "<root><a><b>{}</b></a><a><b>short</b></a></root>".format(BLOB)
+        for product in (True, False):
+            with tempfile.TemporaryDirectory() as spill_dir:
+                rows = convert(xml, product, TextPolicy(8, SPILL, spill_dir))
+                index = rows[0].index("root.a.b.^text")
+                with open(rows[1][index], encoding="utf-8") as f:
+                    self.assertEqual(BLOB, f.read())
+                self.assertEqual("short", rows[2][index])
+
+    def test_spill_names(self):
+        with tempfile.TemporaryDirectory() as spill_dir:
+            paths = {TextPolicy(1, SPILL, spill_dir).apply("ab")
+                     for _ in range(3)}
+            self.assertEqual(3, len(paths))
+            self.assertEqual(3, len(os.listdir(spill_dir)))
+
+    def test_where(self):
+        xml = "<root><a><b>{}</b></a></root>".format(BLOB)
+        with self.assertRaises(ValueError):
+            xml2csv(StringIO(xml), StringIO(), product=False,
+                    where=["a/b != x"], text_policy=TextPolicy(8, HASH))
+        out = StringIO()
+        xml2csv(StringIO(xml), out, where=["a/b != x"],
+                text_policy=TextPolicy(8, TRUNCATE))
+        self.assertIn(BLOB[:8] + "\r\n", out.getvalue())
+
+    def test_unchanged_without_long_text(self):
+        xml = "<root><a x='1'> <b> t </b><b>u</b></a></root>"
+        for product in (True, False):
+            self.assertEqual(convert(xml, product, None),
+                             convert(xml, product, TextPolicy(8, HASH)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import unittest
+from io import StringIO
+
+from xml2csv.main import xml2csv
+from xml2csv.where import parse_where
+
+XML = """<root>
+    <item status="active"><name>a</name><tags><tag>x</tag><tag>y</tag></tags></item>
+    <item status="closed"><name>b</name><tags><tag>x</tag></tags></item>
+    <item status="active"><name>c</name><tags><tag>z</tag><tag>y</tag></tags></item>
+    <item><name>d</name></item>
+</root>"""
+
+
+def convert(where, product):
+    out = StringIO()
+    xml2csv(StringIO(XML), out, product=product, where=where)
+    return out.getvalue().splitlines()
+
+
+class TestWhere(unittest.TestCase):
+    def test_parse(self):
+        predicate = parse_where('item/@status == "active"')
+        self.assertEqual((("item",), "status", "==", "active"),
+                         (predicate.path, predicate.attr, predicate.op,
+                          predicate.value))
+        predicate = parse_where("item/tags/tag != 'x'")
+        self.assertEqual((("item", "tags", "tag"), None, "!=", "x"),
+                         (predicate.path, predicate.attr, predicate.op,
+                          predicate.value))
+        for expression in ("item/@status", "item/@ == 1", "== 1"):
+            with self.assertRaises(ValueError):
+                parse_where(expression)
+
+    def test_subset(self):
+        for product in (True, False):
+            rows = convert(None, product)
+            for where, records in (
+                    (['item/@status == "active"'], ["0", "2"]),
+                    (['item/@status != "active"'], ["1"]),
+                    (["item/tags/tag == y"], ["0", "2"]),
+                    (["item/name == d"], ["3"]),
+                    (['item/@status == "active"', "item/tags/tag == z"],
+                     ["2"]),
+                    (["item/name == e"], [])):
+                filtered = convert(where, product)
+                self.assertEqual(rows[0], filtered[0])
+                expected = [row for row in rows[1:]
+                            if row.split(",")[1] in records]
+                self.assertEqual(expected, filtered[1:], (where, product))
+
+    def test_numbers_are_kept(self):
+        for product in (True, False):
+            rows = convert(["item/name == c"], product)
+            self.assertTrue(all(row.startswith("0,2,") for row in rows[1:]))
+
+
+if __name__ == "__main__":
+    unittest.main()
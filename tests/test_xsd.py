@@ -0,0 +1,118 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import unittest
+from io import StringIO
+
+from xml2csv import sax
+from xml2csv.xsd import compile_xsd
+
+XSD = """<?xml version="1.0"?>
+<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema">
+    <xs:element name="data">
+        <xs:complexType>
+            <xs:sequence>
+                <xs:element name="country" type="CountryType"
+                            maxOccurs="unbounded"/>
+            </xs:sequence>
+        </xs:complexType>
+    </xs:element>
+    <xs:complexType name="CountryType">
+        <xs:sequence>
+            <xs:element name="rank" type="xs:int"/>
+            <xs:element name="year" type="xs:int"/>
+            <xs:element name="gdppc" type="xs:int"/>
+            <xs:element name="neighbor" minOccurs="0" maxOccurs="unbounded">
+                <xs:complexType>
+                    <xs:attribute name="name" type="xs:string"/>
+                    <xs:attribute name="direction" type="xs:string"/>
+                </xs:complexType>
+            </xs:element>
+        </xs:sequence>
+        <xs:attribute name="name" type="xs:string" use="required"/>
+    </xs:complexType>
+</xs:schema>"""
+
+TABLE_XSD = """<?xml version="1.0"?>
+<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema">
+    <xs:element name="root">
+        <xs:complexType>
+            <xs:sequence>
+                <xs:element ref="record" maxOccurs="unbounded"/>
+            </xs:sequence>
+        </xs:complexType>
+    </xs:element>
+    <xs:element name="record">
+        <xs:complexType>
+            <xs:sequence>
+                <xs:element name="foo" type="xs:string"/>
+                <xs:element name="bar" minOccurs="0">
+                    <xs:complexType>
+                        <xs:simpleContent>
+                            <xs:extension base="xs:string">
+                                <xs:attribute name="x" type="xs:string"/>
+                            </xs:extension>
+                        </xs:simpleContent>
+                    </xs:complexType>
+                </xs:element>
+            </xs:sequence>
+            <xs:attribute name="id" type="xs:ID"/>
+        </xs:complexType>
+    </xs:element>
+</xs:schema>"""
+
+
+class TestXsd(unittest.TestCase):
+    def test_same_columns(self):
+        schema = compile_xsd(StringIO(XSD), True)
+        example = os.path.join(os.path.dirname(__file__), "examples",
+                               "example1.xml")
+        self.assertEqual(sax.find_columns(example, True), schema.columns)
+        self.assertFalse(schema.is_table())
+
+    def test_can_repeat(self):
+        schema = compile_xsd(StringIO(XSD))
+        self.assertTrue(schema.can_repeat(("data", "country")))
+        self.assertTrue(schema.can_repeat(("data", "country", "neighbor")))
+        self.assertFalse(schema.can_repeat(("data", "country", "rank")))
+        self.assertFalse(schema.can_repeat(("data",)))
+
+    def test_repeated_field(self):
+        xsd = TABLE_XSD.replace('name="foo"',
+                                'name="foo" maxOccurs="unbounded"')
+        self.assertNotEqual(TABLE_XSD, xsd)
+        self.assertFalse(compile_xsd(StringIO(xsd)).is_table())
+
+    def test_target_namespace(self):
+        xsd = TABLE_XSD.replace('<xs:schema ', '<xs:schema '
+                                'targetNamespace="urn:t" ')
+        self.assertNotEqual(TABLE_XSD, xsd)
+        with self.assertRaises(ValueError):
+            compile_xsd(StringIO(xsd))
+
+    def test_table(self):
+        schema = compile_xsd(StringIO(TABLE_XSD))
+        self.assertEqual([('root', 'record', '@id'),
+                          ('root', 'record', 'foo', '^text'),
+                          ('root', 'record', 'bar', '@x'),
+                          ('root', 'record', 'bar', '^text')], schema.columns)
+        self.assertTrue(schema.is_table())
+
+
+if __name__ == "__main__":
+    unittest.main()
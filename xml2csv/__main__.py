@@ -30,10 +30,70 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
-from main import xml2csv, get_parser
+import os
+import sys
+
+from main import xml2csv, get_parser, conversion_options
+from parts import PartWriter
+from profiling import Profile
+from progress import Progress, BarReporter, JsonLinesReporter
+from sampling import REWRITE, SIDE
+from textpolicy import SPILL
 
 if __name__ == "__main__":
-    args = get_parser().parse_args()
-    xml2csv(args.filename, short_names=args.short_names, aliases=args.aliases,
-            delimiter="\t", product=not args.no_product,
-            number_cols=not args.no_numbers)
+    if sys.argv[1:2] == ["serve"]:
+        from serve import serve
+
+        serve(sys.argv[2:])
+    else:
+        parser = get_parser()
+        args = parser.parse_args()
+        if args.resume and (args.checkpoint is None or args.output is None):
+            parser.error("--resume needs --checkpoint and --output")
+        if args.text_policy == SPILL and args.max_text is not None and (
+                args.spill_dir is None):
+            parser.error("--text-policy spill needs --spill-dir")
+        late = args.sample is not None or args.delta is not None
+        if late and args.late_columns == REWRITE and args.output is None:
+            parser.error("--late-columns rewrite needs --output")
+        if (args.sample is not None and args.late_columns == SIDE
+                and args.side_file is None):
+            parser.error("--late-columns side needs --side-file")
+        split = args.split_rows is not None or args.split_bytes is not None
+        if split and args.output is None:
+            parser.error("--split-rows and --split-bytes need --output")
+        if args.progress is None:
+            progress = reporter = None
+        else:
+            if args.progress == 'bar':
+                reporter = BarReporter(sys.stderr)
+            else:
+                reporter = JsonLinesReporter(sys.stderr)
+            progress = Progress(os.path.getsize(args.filename), reporter)
+        profile = None if args.profile is None else Profile()
+        options = conversion_options(args)
+        writer = None
+        if split:
+            out = writer = PartWriter(args.output, args.split_rows,
+                                      args.split_bytes, args.compress,
+                                      delimiter="\t")
+        elif args.output is None:
+            out = sys.stdout
+        elif args.resume and os.path.exists(args.output):
+            out = open(args.output, "r+", newline="")
+        else:
+            out = open(args.output, "w", newline="")
+        complete = False
+        try:
+            xml2csv(args.filename, out, delimiter="\t", progress=progress,
+                    writer=writer, profile=profile, **options)
+            complete = True
+        finally:
+            if split:
+                out.close(complete)
+            elif out is not sys.stdout:
+                out.close()
+            if isinstance(reporter, BarReporter):
+                reporter.close()
+        if profile is not None:
+            profile.write(sys.stderr, args.profile)
@@ -15,4 +15,59 @@ def make_header(columns, short_names):
         header = [".".join(c[-2:]) for c in columns]
     else:
         header = [".".join(c) for c in columns]
-    return header
\ No newline at end of file
+    return header
+
+
+def check_options(product: bool, aliases=None, sample_size=None,
+                  checkpoint=None, delta_index=None, pipeline=None,
+                  profile=None, where=None, text_policy=None,
+                  intern: bool = False, custom_writer: bool = False,
+                  rewrite: bool = False):
+    """
+    Check that the options of a conversion can be combined. Every entry
+    point (`xml2csv`, `aiter_rows`, `to_columns`, `Pipeline`) checks its
+    options here.
+
+    :param custom_writer: True if the rows are written to a custom writer
+    :param rewrite: True if the header is rewritten at the end
+    :raise ValueError: if the options can't be combined
+    """
+    if aliases and not product:
+        raise ValueError("Can only have aliases with product")
+    if custom_writer and (checkpoint is not None or rewrite):
+        raise ValueError("Can't checkpoint or rewrite with a custom writer")
+    if checkpoint is not None and product:
+        raise ValueError("Can only checkpoint without product")
+    if delta_index is not None and (product or checkpoint is not None):
+        raise ValueError(
+            "Can only write changes without product or checkpoint")
+    if sample_size is not None:
+        if product:
+            raise ValueError("Can only sample columns without product")
+        if pipeline is not None:
+            raise ValueError("Can't sample columns in a pipeline")
+    if intern and (not product or pipeline is not None):
+        raise ValueError("Can only intern values with product, without "
+                         "pipeline")
+    if profile is not None and (pipeline is not None
+                                or sample_size is not None):
+        raise ValueError("Can't profile a pipeline or a sample")
+
+    streamed = (checkpoint is not None or delta_index is not None
+                or pipeline is not None or sample_size is not None)
+    if where:
+        if streamed:
+            raise ValueError("Can't filter a checkpointed, delta, pipelined "
+                             "or sampled conversion")
+        if profile is not None and not product:
+            raise ValueError("Can only profile a filter with product")
+    if text_policy is not None:
+        if streamed:
+            raise ValueError("Can't bound the texts of a checkpointed, "
+                             "delta, pipelined or sampled conversion")
+        if profile is not None and not product:
+            raise ValueError("Can only profile bounded texts with product")
+        if where and not product:
+            # the filter records the events of a pending record, texts
+            # included
+            raise ValueError("Can only filter bounded texts with product")
@@ -0,0 +1,189 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import asyncio
+import tempfile
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import (AsyncIterator, List, Tuple, Mapping, Iterator, Optional,
+                    Callable)
+from xml.etree import ElementTree as ET
+from xml.sax import make_parser
+
+from _util import make_header, check_options
+from dom import ProductFlattener
+from sax import SaxColumnsFinder, NoProductHandler, RowBuffer, CHUNK_SIZE
+
+BATCH_SIZE = 1024
+SPOOL_SIZE = 16 * 1024 * 1024
+
+
+async def _iter_chunks(source, chunk_size: int) -> AsyncIterator[bytes]:
+    """
+    :param source: an async iterable of bytes or an object having a `read`
+                   coroutine (e.g. `asyncio.StreamReader`)
+    """
+    if hasattr(source, "read"):
+        while True:
+            chunk = await source.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        async for chunk in source:
+            yield chunk
+
+
+async def _run(executor: Optional[Executor], func: Callable, *args):
+    if executor is None:
+        return func(*args)
+    else:
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, func, *args)
+
+
+async def aiter_rows(source, columns: List[Tuple[str]] = None,
+                     short_names: bool = False, product: bool = True,
+                     aliases: Mapping[str, str] = None,
+                     number_cols: bool = True,
+                     executor: Optional[Executor] = None,
+                     chunk_size: int = CHUNK_SIZE,
+                     batch_size: int = BATCH_SIZE
+                     ) -> AsyncIterator[List[list]]:
+    """
+    Yield batches of at most `batch_size` rows, the first batch being the
+    header. The next chunk of the source is read only when the consumer
+    asks for the next batch. The defaults are those of `xml2csv`: product
+    and number columns.
+
+    Without product, the chunks are fed to a SAX parser. If the columns are
+    not given, the whole source is first spooled to a temporary file (on
+    disk beyond `SPOOL_SIZE`) to find the columns, since the header comes
+    first: give the columns (e.g. from an XSD) to stream from the first
+    chunk.
+
+    With product, the whole tree is built chunk by chunk, then flattened:
+    only the flatten is streamed.
+
+    :param source: an async iterable of bytes or an object having a `read`
+                   coroutine
+    :param executor: if not None, the executor that parses and flattens.
+                     The parsers can't be pickled: a `ProcessPoolExecutor`
+                     is rejected.
+    """
+    if isinstance(executor, ProcessPoolExecutor):
+        raise ValueError("Can't parse in a process pool")
+    check_options(product, aliases)
+    if product:
+        batches = _aiter_product_rows(source, columns, short_names, aliases,
+                                      number_cols, executor, chunk_size,
+                                      batch_size)
+    else:
+        batches = _aiter_no_product_rows(source, columns, short_names,
+                                         number_cols, executor, chunk_size,
+                                         batch_size)
+    async for batch in batches:
+        yield batch
+
+
+async def _aiter_no_product_rows(source, columns, short_names, number_cols,
+                                 executor, chunk_size, batch_size
+                                 ) -> AsyncIterator[List[list]]:
+    spooled = None
+    chunks = _iter_chunks(source, chunk_size)
+    if columns is None:
+        spooled = tempfile.SpooledTemporaryFile(SPOOL_SIZE)
+        columns = await _spool_and_find_columns(chunks, spooled, number_cols,
+                                                executor)
+        chunks = _iter_spooled(spooled, chunk_size)
+
+    try:
+        yield [make_header(columns, short_names)]
+
+        buffer = RowBuffer()
+        parser = make_parser()
+        parser.setContentHandler(NoProductHandler(buffer, columns))
+        async for chunk in chunks:
+            await _run(executor, parser.feed, chunk)
+            for batch in _split(buffer.pop_rows(), batch_size):
+                yield batch
+        await _run(executor, parser.close)
+        for batch in _split(buffer.pop_rows(), batch_size):
+            yield batch
+    finally:
+        if spooled is not None:
+            spooled.close()
+
+
+async def _spool_and_find_columns(chunks: AsyncIterator[bytes], spooled,
+                                  number_cols: bool,
+                                  executor: Optional[Executor]
+                                  ) -> List[Tuple[str]]:
+    parser = make_parser()
+    handler = SaxColumnsFinder(number_cols)
+    parser.setContentHandler(handler)
+    loop = asyncio.get_running_loop()
+    async for chunk in chunks:
+        # the spooled file may be on disk: the default executor
+        await loop.run_in_executor(None, spooled.write, chunk)
+        await _run(executor, parser.feed, chunk)
+    await _run(executor, parser.close)
+    spooled.seek(0)
+    return handler.columns()
+
+
+async def _iter_spooled(spooled, chunk_size: int) -> AsyncIterator[bytes]:
+    loop = asyncio.get_running_loop()
+    while True:
+        chunk = await loop.run_in_executor(None, spooled.read, chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def _split(rows: List[list], batch_size: int) -> Iterator[List[list]]:
+    for i in range(0, len(rows), batch_size):
+        yield rows[i:i + batch_size]
+
+
+async def _aiter_product_rows(source, columns, short_names, aliases,
+                              number_cols, executor, chunk_size, batch_size
+                              ) -> AsyncIterator[List[list]]:
+    parser = ET.XMLParser()
+    async for chunk in _iter_chunks(source, chunk_size):
+        await _run(executor, parser.feed, chunk)
+    root = await _run(executor, parser.close)
+
+    flattener = ProductFlattener(root, short_names=short_names,
+                                 number_cols=number_cols, aliases=aliases,
+                                 columns=columns)
+    rows = flattener.flatten()
+    # the header: the columns are found on the whole tree
+    yield [await _run(executor, next, rows)]
+    while True:
+        batch = await _run(executor, _next_batch, rows, batch_size)
+        if not batch:
+            break
+        yield batch
+
+
+def _next_batch(rows: Iterator[list], batch_size: int) -> List[list]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            break
+    return batch
@@ -0,0 +1,194 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import pickle
+from typing import List, Tuple, Optional, Mapping, Any, TextIO
+from xml.parsers import expat
+
+from _util import make_header
+from sax import NoProductHandler, Context, find_columns, CHUNK_SIZE
+
+CHECKPOINT_VERSION = 2
+CHECKPOINT_EVERY = 10000
+
+
+class _CountingWriter:
+    def __init__(self, writer, rows: int):
+        self._writer = writer
+        self.rows = rows
+
+    def writerow(self, row):
+        self._writer.writerow(row)
+        self.rows += 1
+
+
+class CheckpointHandler(NoProductHandler):
+    """
+    A `NoProductHandler` whose state between two records (children of the
+    root) can be saved and restored.
+    """
+
+    @property
+    def context(self) -> Optional[Context]:
+        return self._context
+
+    def restore(self, context: Context):
+        self._context = context
+        self._chars = []
+
+
+class CheckpointedFlattener:
+    """
+    A no product conversion that saves a checkpoint every `every` records.
+    A checkpoint is taken at the start tag of a record, and holds the
+    offset of the tag in the input, the rows written, the offset of the
+    output, the context of the root (with the counters) and the columns.
+
+    The output must be a seekable file. On resume, the output is truncated
+    to the last checkpoint and the parsing continues from the offset of
+    the record: the parser is first fed the prolog and the root start tag.
+    Without checkpoint, the output is truncated.
+
+    If `progress` is not None, it counts the bytes read by this run.
+    """
+
+    def __init__(self, filename: str, checkpoint_path: str,
+                 every: int = CHECKPOINT_EVERY, short_names: bool = False,
+                 number_cols: bool = False, columns: List[Tuple[str]] = None,
+                 progress=None):
+        self._filename = filename
+        self._progress = progress
+        self._checkpoint_path = checkpoint_path
+        self._every = every
+        self._short_names = short_names
+        self._number_cols = number_cols
+        self._columns = columns
+
+    def flatten(self, writer, out: TextIO, resume: bool = False):
+        state = self.load() if resume else None
+        if state is None:
+            columns = self._columns
+            if columns is None:
+                columns = find_columns(self._filename, self._number_cols)
+            out.seek(0)
+            out.truncate()
+            writer.writerow(make_header(columns, self._short_names))
+            writer = _CountingWriter(writer, 0)
+        else:
+            columns = state["columns"]
+            out.seek(state["output_offset"])
+            out.truncate()
+            writer = _CountingWriter(writer, state["rows"])
+
+        handler = CheckpointHandler(writer, columns)
+        if self._progress is not None:
+            self._progress.watch(handler)
+        conversion = _Conversion(self, handler, writer, out, columns,
+                                 self._progress)
+        conversion.run(self._filename, state)
+        if os.path.exists(self._checkpoint_path):
+            os.remove(self._checkpoint_path)
+
+    def load(self) -> Optional[Mapping[str, Any]]:
+        """
+        :return: the last checkpoint of this file, or None
+        """
+        try:
+            with open(self._checkpoint_path, "rb") as f:
+                state = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        if (state["version"] != CHECKPOINT_VERSION
+                or state["input_size"] != os.path.getsize(self._filename)):
+            raise ValueError("The checkpoint does not match the input")
+        return state
+
+    @property
+    def every(self) -> int:
+        return self._every
+
+    def save(self, state: Mapping[str, Any]):
+        tmp_path = self._checkpoint_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f)
+        os.replace(tmp_path, self._checkpoint_path)
+
+
+class _Conversion:
+    def __init__(self, flattener: CheckpointedFlattener,
+                 handler: CheckpointHandler, writer: _CountingWriter,
+                 out: TextIO, columns: List[Tuple[str]], progress=None):
+        self._flattener = flattener
+        self._progress = progress
+        self._handler = handler
+        self._writer = writer
+        self._out = out
+        self._columns = columns
+        self._parser = expat.ParserCreate()
+        self._parser.buffer_text = True
+        self._input_size = None
+        self._prefix_end = None
+        self._delta = 0
+        self._record_count = 0
+
+    def run(self, filename: str, state: Optional[Mapping[str, Any]]):
+        self._input_size = os.path.getsize(filename)
+        parser = self._parser
+        progress = self._progress
+        with open(filename, "rb") as f:
+            if state is not None:
+                self._prefix_end = state["prefix_end"]
+                parser.Parse(f.read(self._prefix_end), False)
+                self._handler.restore(state["context"])
+                f.seek(state["input_offset"])
+                self._delta = state["input_offset"] - self._prefix_end
+
+            parser.StartElementHandler = self._start_element
+            parser.EndElementHandler = self._handler.endElement
+            parser.CharacterDataHandler = self._handler.characters
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                parser.Parse(chunk, False)
+                if progress is not None:
+                    progress.add_bytes(len(chunk))
+            parser.Parse(b"", True)
+
+    def _start_element(self, name: str, attrs: Mapping[str, str]):
+        if self._handler.depth == 1:
+            offset = self._parser.CurrentByteIndex + self._delta
+            if self._prefix_end is None:
+                self._prefix_end = offset
+            elif self._record_count % self._flattener.every == 0:
+                self._checkpoint(offset)
+            self._record_count += 1
+        self._handler.startElement(name, attrs)
+
+    def _checkpoint(self, offset: int):
+        self._out.flush()
+        self._flattener.save({
+            "version": CHECKPOINT_VERSION,
+            "input_size": self._input_size,
+            "prefix_end": self._prefix_end,
+            "input_offset": offset,
+            "rows": self._writer.rows,
+            "output_offset": self._out.tell(),
+            "context": self._handler.context,
+            "columns": self._columns,
+        })
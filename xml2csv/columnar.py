@@ -0,0 +1,255 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import collections.abc
+import re
+from array import array
+from io import StringIO
+from typing import (List, Tuple, Dict, Sequence, Iterator, Union, Mapping,
+                    Optional)
+from xml.etree import ElementTree as ET
+
+from _util import NUM, TEXT, DEFAULT, make_header, check_options
+from dom import DomColumnsFinder, ProductFlattener
+from interning import ColumnDictionaries, ColumnDictionary
+from sax import NoProductFlattener, find_columns
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# the texts that are numbers: `int` and `float` would also accept "1_000",
+# "nan", "inf" or " 12 "
+INT_RE = re.compile(r"[-+]?[0-9]+")
+FLOAT_RE = re.compile(
+    r"[-+]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][-+]?[0-9]+)?")
+
+
+def _numeric_type(values: Sequence) -> Optional[type]:
+    """
+    :param values: the texts, `None` for a missing value
+    :return: `int` or `float` if every text is a number, None otherwise
+    """
+    present = [v for v in values if v is not None]
+    if all(INT_RE.fullmatch(v) for v in present):
+        return int
+    if all(FLOAT_RE.fullmatch(v) for v in present):
+        return float
+    return None
+
+
+class DictionaryColumn(collections.abc.Sequence):
+    """
+    A dictionary encoded column: the codes of the values in the categories,
+    -1 for a missing value.
+    """
+
+    def __init__(self, codes: Sequence[int], categories: List[str]):
+        self.codes = codes
+        self.categories = categories
+
+    def __getitem__(self, index: int) -> Optional[str]:
+        code = self.codes[index]
+        return None if code == -1 else self.categories[code]
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+
+class ColumnarBuilder:
+    """
+    Store the values of the rows column by column, then convert each column:
+    `#num` columns to integers, `^text` columns to integers or floats if
+    every value is a decimal number (see `INT_RE` and `FLOAT_RE`). Other
+    columns are kept as strings.
+
+    Missing values are `None`. With numpy, the columns are numpy arrays; a
+    numeric column with missing values is a float array (`nan`).
+
+    With dictionaries, the values are interned, and the string columns are
+    `DictionaryColumn`s, unless their dictionary overflowed.
+    """
+
+    def __init__(self, columns: List[Tuple[str]],
+                 dictionaries: Optional[ColumnDictionaries] = None):
+        self._columns = columns
+        self._buffers: List[list] = [[] for _ in columns]
+        if dictionaries is None:
+            self._dictionaries = None
+        else:
+            self._dictionaries = [None if column[-1] == NUM
+                                  else dictionaries[column]
+                                  for column in columns]
+
+    def append(self, row: list):
+        if self._dictionaries is None:
+            for buffer, value in zip(self._buffers, row):
+                buffer.append(value)
+        else:
+            for buffer, dictionary, value in zip(self._buffers,
+                                                 self._dictionaries, row):
+                if dictionary is not None and value != DEFAULT:
+                    value = dictionary.intern(value)
+                buffer.append(value)
+
+    def build(self) -> List[Sequence]:
+        if self._dictionaries is None:
+            return [self._convert(column[-1], buffer)
+                    for column, buffer in zip(self._columns, self._buffers)]
+        return [self._convert(column[-1], buffer, dictionary)
+                for column, buffer, dictionary in zip(
+                    self._columns, self._buffers, self._dictionaries)]
+
+    def _convert(self, terminal: str, values: list,
+                 dictionary: Optional[ColumnDictionary] = None) -> Sequence:
+        if np is None:
+            converted = self._convert_list(terminal, values)
+        else:
+            converted = self._convert_array(terminal, values)
+        if (dictionary is None or dictionary.overflowed
+                or not self._is_str(converted)):
+            return converted
+        codes = [-1 if v is None else dictionary.code(v) for v in converted]
+        if np is None:
+            codes = array('l', codes)
+        else:
+            codes = np.array(codes, dtype=np.int32)
+        return DictionaryColumn(codes, dictionary.categories)
+
+    def _is_str(self, values: Sequence) -> bool:
+        if np is not None and isinstance(values, np.ndarray):
+            return values.dtype == object
+        return isinstance(values, list) and any(
+            isinstance(v, str) for v in values)
+
+    def _convert_list(self, terminal: str, values: list) -> Sequence:
+        values = [None if v == DEFAULT else v for v in values]
+        if terminal == NUM:
+            if None in values:
+                return values
+            return array('q', values)
+        elif terminal == TEXT:
+            convert = _numeric_type(values)
+            if convert is not None:
+                return [None if v is None else convert(v) for v in values]
+        return values
+
+    def _convert_array(self, terminal: str, values: list) -> Sequence:
+        arr = np.array(values, dtype=object)
+        missing = arr == DEFAULT
+        if terminal == NUM:
+            if missing.any():
+                arr[missing] = np.nan
+                return arr.astype(np.float64)
+            return arr.astype(np.int64)
+        elif terminal == TEXT:
+            convert = _numeric_type(arr[~missing])
+            if convert is int:
+                dtypes = (np.int64, np.float64)  # float if too large
+            elif convert is float:
+                dtypes = (np.float64,)
+            else:
+                dtypes = ()
+            filled = arr.copy()
+            filled[missing] = "0"
+            for dtype in dtypes:
+                try:
+                    converted = filled.astype(str).astype(dtype)
+                except OverflowError:
+                    continue
+                if missing.any():
+                    converted = converted.astype(np.float64)
+                    converted[missing] = np.nan
+                return converted
+        arr[missing] = None
+        return arr
+
+
+def _columns_and_rows(filename: Union[str, StringIO], product: bool,
+                      aliases: Mapping[str, str], number_cols: bool,
+                      dictionaries: Optional[ColumnDictionaries]
+                      ) -> Tuple[List[Tuple[str]], Iterator[list]]:
+    """
+    :return: the columns and the rows, without the header. With product,
+             the file is parsed once: the columns are found on the tree.
+    """
+    check_options(product, aliases)
+    if product:
+        root = ET.parse(filename).getroot()
+        columns = DomColumnsFinder(number_cols).find_columns(root)
+        rows = ProductFlattener(root, number_cols=number_cols,
+                                aliases=aliases, columns=columns,
+                                dictionaries=dictionaries).flatten()
+    else:
+        if isinstance(filename, str):
+            f1 = f2 = filename
+        else:
+            text = filename.read()
+            f1 = StringIO(text)
+            f2 = StringIO(text)
+        columns = find_columns(f1, number_cols)
+        rows = NoProductFlattener(f2, number_cols=number_cols,
+                                  columns=columns).rows()
+    next(rows)  # skip header
+    return columns, rows
+
+
+def _build(filename: Union[str, StringIO], short_names: bool, product: bool,
+           aliases: Mapping[str, str], number_cols: bool,
+           dictionary_encode: bool) -> Tuple[List[str], List[Sequence]]:
+    dictionaries = ColumnDictionaries() if dictionary_encode else None
+    columns, rows = _columns_and_rows(filename, product, aliases,
+                                      number_cols, dictionaries)
+    builder = ColumnarBuilder(columns, dictionaries)
+    for row in rows:
+        builder.append(row)
+    return make_header(columns, short_names), builder.build()
+
+
+def to_columns(filename: Union[str, StringIO], short_names: bool = False,
+               product: bool = True, aliases: Mapping[str, str] = None,
+               number_cols: bool = True, dictionary_encode: bool = False
+               ) -> Dict[str, Sequence]:
+    """
+    :param dictionary_encode: if True, the string columns are
+                              `DictionaryColumn`s
+    :return: a mapping header -> column values, without writing a CSV file.
+    """
+    header, values = _build(filename, short_names, product, aliases,
+                            number_cols, dictionary_encode)
+    if len(set(header)) != len(header):
+        raise ValueError("Duplicate column names: {}".format(header))
+    return dict(zip(header, values))
+
+
+def to_dataframe(filename: Union[str, StringIO], short_names: bool = False,
+                 product: bool = True, aliases: Mapping[str, str] = None,
+                 number_cols: bool = True, dictionary_encode: bool = False):
+    """
+    :param dictionary_encode: if True, the string columns are categorical
+    :return: a pandas DataFrame, without writing a CSV file.
+    """
+    import pandas as pd
+
+    header, values = _build(filename, short_names, product, aliases,
+                            number_cols, dictionary_encode)
+    values = [pd.Categorical.from_codes(v.codes, v.categories)
+              if isinstance(v, DictionaryColumn) else v for v in values]
+    df = pd.DataFrame(dict(enumerate(values)))
+    df.columns = header
+    return df
@@ -0,0 +1,294 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import hashlib
+import json
+import os
+from io import StringIO
+from typing import List, Tuple, Optional, Dict, Mapping
+from xml.sax import make_parser
+from xml.sax.handler import ContentHandler
+from xml.sax.xmlreader import AttributesImpl
+
+from _util import make_header, DEFAULT
+from sampling import SamplingHandler, APPEND, REWRITE
+from sax import EventRecorder, find_columns, iter_chunks
+
+INDEX_VERSION = 2
+INSERT = "insert"
+UPDATE = "update"
+DELETE = "delete"
+ROOT = "root"
+DELTA_HEADER = ["op", "key"]
+
+
+class DeltaWriter:
+    """
+    A writer that prefixes the rows with the operation and the key of the
+    current record. The rows written outside of a record (the terminal
+    children of the root, written at the end) have the `ROOT` operation.
+    """
+
+    def __init__(self, writer):
+        self._writer = writer
+        self.op = ROOT
+        self.key = ""
+
+    def writerow(self, row):
+        self._writer.writerow([self.op, self.key] + list(row))
+
+
+def _framed(tag: bytes, value: str) -> bytes:
+    data = value.encode("utf-8")
+    return tag + len(data).to_bytes(8, "little") + data
+
+
+class _DeltaDispatcher(ContentHandler):
+    """
+    Hash the subtree of each record (child of the root) and flatten only
+    the new or changed records. The unchanged records are skipped, but
+    counted.
+
+    The hash of a record is a hash of framed events: `S` (start, with the
+    tag and the sorted attributes, each prefixed by its length), `T` (the
+    digest of the text between two tags, whatever the chunks) and `E`
+    (end). The attributes of the root, copied into every row, are hashed
+    first. If `number_cols` is True, the number of the record among the
+    records of the same tag (its `#num`) is hashed too: a record that moves
+    is updated.
+
+    The columns that are not in the header (late columns) are rejected,
+    unless `late_columns` is True (the header is rewritten at the end).
+    """
+
+    def __init__(self, handler: SamplingHandler, writer: DeltaWriter,
+                 old_hashes: Dict[str, str], key: Optional[str],
+                 number_cols: bool = False, late_columns: bool = False):
+        super().__init__()
+        self._handler = handler
+        self._writer = writer
+        self._old_hashes = old_hashes
+        self._key = key
+        self._number_cols = number_cols
+        self._late_columns = late_columns
+        self._count_by_name: Dict[str, int] = {}
+        self.hashes: Dict[str, str] = {}
+        self.counts = {INSERT: 0, UPDATE: 0, "unchanged": 0}
+        self._recorder = EventRecorder()
+        self._depth = 0
+        self._position = 0
+        self._record_key = None
+        self._hash = None
+        self._text_hash = None
+        self._root_frame = b""
+
+    def startElement(self, name: str, attrs: AttributesImpl):
+        self._depth += 1
+        if self._depth == 1:
+            self._root_frame = self._start_frame(name, attrs)
+            self._handler.startElement(name, attrs)
+            return
+
+        if self._depth == 2:
+            self._record_key = self._get_key(attrs)
+            self._position += 1
+            self._hash = hashlib.blake2b(self._root_frame, digest_size=16)
+            num = self._count_by_name.get(name, 0)
+            self._count_by_name[name] = num + 1
+            if self._number_cols:
+                self._hash.update(b"#" + num.to_bytes(8, "little"))
+            self._recorder.clear()
+        else:
+            self._flush_text()
+        self._recorder.startElement(name, attrs)
+        self._hash.update(self._start_frame(name, attrs))
+
+    def _start_frame(self, name: str, attrs: AttributesImpl) -> bytes:
+        frames = [b"S", _framed(b"N", name),
+                  len(attrs).to_bytes(8, "little")]
+        for attr_name in sorted(attrs.keys()):
+            frames.append(_framed(b"A", attr_name))
+            frames.append(_framed(b"V", attrs[attr_name]))
+        return b"".join(frames)
+
+    def _flush_text(self):
+        if self._text_hash is not None:
+            self._hash.update(b"T" + self._text_hash.digest())
+            self._text_hash = None
+
+    def _get_key(self, attrs: AttributesImpl) -> str:
+        if self._key is None:
+            return str(self._position)
+        try:
+            return attrs[self._key]
+        except KeyError:
+            raise ValueError("Record {} has no attribute {}".format(
+                self._position, self._key))
+
+    def endElement(self, name: str):
+        self._depth -= 1
+        if self._depth == 0:
+            self._handler.endElement(name)
+            return
+
+        self._recorder.endElement(name)
+        self._flush_text()
+        self._hash.update(b"E")
+        if self._depth == 1:
+            self._end_record(name)
+
+    def _end_record(self, name: str):
+        key = self._record_key
+        if key in self.hashes:
+            raise ValueError("Duplicate key: {}".format(key))
+        digest = self._hash.hexdigest()
+        self.hashes[key] = digest
+        old_digest = self._old_hashes.pop(key, None)
+        if old_digest == digest:
+            self.counts["unchanged"] += 1
+            self._handler.skip_element(name)
+        else:
+            op = INSERT if old_digest is None else UPDATE
+            self.counts[op] += 1
+            self._writer.op = op
+            self._writer.key = key
+            self._recorder.replay(self._handler)
+            self._writer.op = ROOT
+            self._writer.key = ""
+            if self._handler.late_columns and not self._late_columns:
+                raise ValueError(
+                    "Record {} has new columns: {} (rewrite the header)"
+                    .format(key, ", ".join(".".join(c) for c in
+                                           self._handler.late_columns)))
+
+    def characters(self, content: str):
+        if self._depth >= 2:
+            self._recorder.characters(content)
+            if self._text_hash is None:
+                self._text_hash = hashlib.blake2b(digest_size=16)
+            self._text_hash.update(content.encode("utf-8"))
+        else:
+            self._handler.characters(content)
+
+
+class DeltaFlattener:
+    """
+    A no product conversion that writes only the changes since the
+    previous run: the rows of the new and changed records (children of the
+    root), and a row per deleted record. Each row is prefixed by the
+    operation (`INSERT`, `UPDATE`, `DELETE` or `ROOT`) and by the key of
+    the record: its position, or the value of the `key` attribute.
+
+    The hashes of the records and the columns are stored in an index file,
+    replaced at the end of the conversion. Without index, every record is
+    an insert. With an index, the columns are those of the previous run.
+    The new columns are rejected, unless the policy is `REWRITE`: they are
+    appended (see `SamplingHandler`) and the header must be rewritten at
+    the end.
+    """
+
+    def __init__(self, filename, index_path: str, key: Optional[str] = None,
+                 short_names: bool = False, number_cols: bool = False,
+                 columns: List[Tuple[str]] = None, policy: str = APPEND,
+                 progress=None):
+        self._filename = filename
+        self._policy = policy
+        self._progress = progress
+        self._index_path = index_path
+        self._key = key
+        self._short_names = short_names
+        self._number_cols = number_cols
+        self._columns = columns
+        self._handler = None
+        self.counts: Mapping[str, int] = {}
+
+    @property
+    def columns(self) -> List[Tuple[str]]:
+        """
+        :return: the columns, then the late columns
+        """
+        return [] if self._handler is None else self._handler.columns
+
+    @property
+    def late_columns(self) -> List[Tuple[str]]:
+        return [] if self._handler is None else self._handler.late_columns
+
+    def header(self) -> List[str]:
+        return DELTA_HEADER + make_header(self.columns, self._short_names)
+
+    def flatten(self, writer):
+        index = self.load()
+        if isinstance(self._filename, str):
+            f1 = f2 = self._filename
+        else:
+            text = self._filename.read()
+            f1 = StringIO(text)
+            f2 = StringIO(text)
+
+        columns = self._columns
+        if columns is None:
+            if index is None:
+                columns = find_columns(f1, self._number_cols)
+            else:
+                columns = [tuple(c) for c in index["columns"]]
+        old_hashes = {} if index is None else dict(index["hashes"])
+        writer.writerow(DELTA_HEADER + make_header(columns,
+                                                   self._short_names))
+
+        delta_writer = DeltaWriter(writer)
+        self._handler = SamplingHandler(delta_writer, columns,
+                                        self._number_cols, APPEND)
+        dispatcher = _DeltaDispatcher(self._handler, delta_writer, old_hashes,
+                                      self._key, self._number_cols,
+                                      self._policy == REWRITE)
+        parser = make_parser()
+        parser.setContentHandler(dispatcher)
+        progress = self._progress
+        if progress is not None:
+            progress.watch(self._handler)
+        for chunk in iter_chunks(f2):
+            parser.feed(chunk)
+            if progress is not None:
+                progress.add_bytes(len(chunk))
+        parser.close()
+
+        empty = [DEFAULT] * len(self._handler.columns)
+        for key in old_hashes:
+            writer.writerow([DELETE, key] + empty)
+        self.counts = dict(dispatcher.counts, **{DELETE: len(old_hashes)})
+        self.save(dispatcher.hashes)
+
+    def load(self) -> Optional[Mapping]:
+        """
+        :return: the index of the previous run, or None
+        """
+        try:
+            with open(self._index_path, encoding="utf-8") as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return None
+        if index["version"] != INDEX_VERSION or index["key"] != self._key:
+            raise ValueError("The index does not match: version {}, key {}"
+                             .format(index["version"], index["key"]))
+        return index
+
+    def save(self, hashes: Mapping[str, str]):
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "key": self._key,
+                       "columns": self._handler.columns, "hashes": hashes}, f)
+        os.replace(tmp_path, self._index_path)
@@ -17,12 +17,20 @@
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import collections
 import itertools
+import math
 from io import StringIO
-from typing import Tuple, List, Union, Mapping, Dict
+from typing import (Tuple, List, Union, Mapping, Dict, Optional, Sequence,
+                    TYPE_CHECKING)
 from xml.etree import ElementTree as ET
 from xml.etree.ElementTree import Element
 
 from _util import TEXT, ATTR, NUM, RowDict, Path, DEFAULT, make_header
+from interning import ColumnDictionaries, ColumnDictionary
+
+if TYPE_CHECKING:
+    from progress import Progress
+    from textpolicy import TextPolicy
+    from where import Predicate
 
 
 class DomColumnsFinder:
@@ -65,24 +73,119 @@ def find_columns(filepath: Union[str, StringIO],
     return DomColumnsFinder(number_cols).find_columns(root)
 
 
+class _ChildSlot:
+    """
+    The keys of the children of a path that have the same tag.
+    """
+    __slots__ = ("path", "num_key", "text_key", "group", "plan",
+                 "text_dictionary")
+
+    def __init__(self, path: Path, group: str, aliases: Mapping[str, str],
+                 dictionaries: Optional[ColumnDictionaries]):
+        self.path = path
+        self.num_key = path + (NUM,)
+        self.text_key = path + (TEXT,)
+        self.group = group
+        self.plan = _PathPlan(path, aliases, dictionaries)
+        self.text_dictionary: Optional[ColumnDictionary] = None
+
+
+class _PathPlan:
+    """
+    The decisions shared by all the nodes of a path: the slots of the
+    children by tag, with their alias group, and the keys of the
+    attributes. The plan is compiled on the first node of the path and
+    grows when a node has a new tag or attribute.
+    """
+
+    def __init__(self, path: Path, aliases: Mapping[str, str],
+                 dictionaries: Optional[ColumnDictionaries]):
+        self.path = path
+        self.has_aliases = False
+        self._aliases = aliases
+        self._dictionaries = dictionaries
+        self._slot_by_tag: Dict[str, _ChildSlot] = {}
+        self._attr_key_by_name: Dict[str, Path] = {}
+        self._attr_dictionary_by_name: Dict[str, ColumnDictionary] = {}
+
+    def slot(self, tag: str) -> _ChildSlot:
+        slot = self._slot_by_tag.get(tag)
+        if slot is None:
+            group = self._aliases.get(tag, tag)
+            if group != tag:
+                self.has_aliases = True
+            slot = _ChildSlot(self.path + (tag,), group, self._aliases,
+                              self._dictionaries)
+            self._slot_by_tag[tag] = slot
+        return slot
+
+    def attr_key(self, name: str) -> Path:
+        key = self._attr_key_by_name.get(name)
+        if key is None:
+            key = self.path + (ATTR + name,)
+            self._attr_key_by_name[name] = key
+        return key
+
+    def attr_dictionary(self, name: str) -> ColumnDictionary:
+        dictionary = self._attr_dictionary_by_name.get(name)
+        if dictionary is None:
+            dictionary = self._dictionaries[self.attr_key(name)]
+            self._attr_dictionary_by_name[name] = dictionary
+        return dictionary
+
+
 class ProductFlattener:
     def __init__(self, root: ET.Element, short_names: bool = False,
                  no_product=False, aliases: Mapping[str, str] = None,
-                 number_cols=False):
+                 number_cols=False, columns: List[Tuple[str]] = None,
+                 dictionaries: Optional[ColumnDictionaries] = None,
+                 where: Sequence["Predicate"] = None,
+                 text_policy: Optional["TextPolicy"] = None,
+                 progress: Optional["Progress"] = None):
+        """
+        :param dictionaries: if not None, the text and attribute values are
+                             interned through these dictionaries
+        :param where: if not None, only the records (children of the root)
+                      that match all these predicates are flattened. The
+                      other records are counted, but not expanded.
+        :param text_policy: if not None, the policy for the long texts. The
+                            tree holds the whole texts, but the rows only
+                            hold the values of the policy.
+        :param progress: if not None, checked at every node and before
+                         every cartesian product, with the `depth` and the
+                         `fan_out` of this flattener
+        """
         self._root = root
         self._short_names = short_names
-        if no_product is False:
-            self._aliases = {} if aliases is None else aliases
-        elif aliases:
+        if no_product is not False and aliases:
             raise ValueError()
+        self._aliases = {} if aliases is None else aliases
         self._number_cols = number_cols
+        self._columns = columns
+        self._dictionaries = dictionaries
+        self._text_policy = text_policy
+        self._progress = progress
+        if progress is not None:
+            progress.watch(self)
+        if where:
+            self._skipped = {record for record in root
+                             if not all(p.matches(record) for p in where)}
+        else:
+            self._skipped = set()
 
         self.row_dicts_by_element: Dict[ET.Element, List[RowDict]] = {}
         self.attrs_by_element: Dict[ET.Element, RowDict] = {}
         self._nodes = []
+        self._root_slot = _ChildSlot((root.tag,), root.tag, self._aliases,
+                                     dictionaries)
+        self.depth = 0
+        self.fan_out = 0
 
     def flatten(self):
-        columns = DomColumnsFinder(self._number_cols).find_columns(self._root)
+        columns = self._columns
+        if columns is None:
+            columns = DomColumnsFinder(self._number_cols).find_columns(
+                self._root)
         yield make_header(columns, self._short_names)
 
         bottom_up_nodes = self._find_non_terminal_and_order_bottom_up()
@@ -90,96 +193,131 @@ class ProductFlattener:
         for row_dict in self.row_dicts_by_element[self._root]:
             yield [row_dict.get(col, DEFAULT) for col in columns]
 
-    def _find_non_terminal_and_order_bottom_up(self):
+    def _find_non_terminal_and_order_bottom_up(
+            self) -> List[Tuple[_PathPlan, Element]]:
         nodes = []
-        queue = [((self._root.tag,), self._root)]
+        queue = collections.deque([(self._root_slot.plan, self._root)])
         while queue:
-            tags, n = queue.pop()
-            nodes.insert(0, (tags, n))
+            plan, n = queue.pop()
+            nodes.append((plan, n))
             for c in n:
-                if list(c) or c.attrib:
-                    queue.insert(0, (tags + (c.tag,), c))
+                if (len(c) or c.attrib) and c not in self._skipped:
+                    queue.appendleft((plan.slot(c.tag).plan, c))
 
+        nodes.reverse()
         return nodes
 
-    def _flatten(self, bottom_up_nodes: List[Tuple[Path, Element]]):
+    def _flatten(self, bottom_up_nodes: List[Tuple[_PathPlan, Element]]):
         # inverted BFS, non terminal nodes
-        for path, node in bottom_up_nodes:
-            row_dicts_by_tag = self._group_children_by_path(path, node)
-            new_row_dicts = self._flatten_tags(row_dicts_by_tag)
-            attrs = self._create_attrs(path, node)
-            self.row_dicts_by_element[node] = [{**attrs, **rd} for rd in
-                                               new_row_dicts]
+        for plan, node in bottom_up_nodes:
+            self.depth = len(plan.path)
+            if self._progress is not None:
+                self._progress.check()
+            self.row_dicts_by_element[node] = self._flatten_node(plan, node)
         self.row_dicts_by_element[self._root] = self._rows_with_preamble_added(
-            (self._root.tag,), self._root, 0)
+            self._root_slot, self._root, 0)
+
+    def _flatten_node(self, plan: _PathPlan, node: ET.Element
+                      ) -> List[RowDict]:
+        row_dicts_by_slot = self._group_children_by_path(plan, node)
+        if not row_dicts_by_slot and self._skipped and node is self._root:
+            return []  # every record was skipped
+        new_row_dicts = self._flatten_tags(plan, row_dicts_by_slot)
+        if node.attrib:
+            attrs = self._create_attrs(plan, node)
+            new_row_dicts = [{**attrs, **rd} for rd in new_row_dicts]
+        return new_row_dicts
 
-    def _group_children_by_path(self, path: Path, node: ET.Element
-                                ) -> Dict[Path, List[RowDict]]:
-        counter = collections.Counter()
-        row_dicts_by_tag = {}
+    def _group_children_by_path(self, plan: _PathPlan, node: ET.Element
+                                ) -> Dict[_ChildSlot, List[RowDict]]:
+        counter = {}
+        row_dicts_by_slot = {}
 
         for child in node:
-            num = counter[child.tag]
-            cur_path = path + (child.tag,)
+            slot = plan.slot(child.tag)
+            num = counter.get(slot, 0)
+            counter[slot] = num + 1
+            if child in self._skipped:
+                continue
             rows_with_preamble = self._rows_with_preamble_added(
-                cur_path, child, num)
-            self._add_new_rows_to_child_tag(row_dicts_by_tag,
-                                            child.tag,
+                slot, child, num)
+            self._add_new_rows_to_child_tag(row_dicts_by_slot, slot,
                                             rows_with_preamble)
-            counter[child.tag] += 1
-        return row_dicts_by_tag
-
-    def _rows_with_preamble_added(self, path: Path, node: Element, num: int
-                                  ) -> List[RowDict]:
-        preamble = {path + ("#num",): num}
-        if node.text and node.text.strip():
-            preamble[path + ("^text",)] = node.text.strip()
-        row_dicts = self.row_dicts_by_element.get(node, [{}])
+        return row_dicts_by_slot
+
+    def _rows_with_preamble_added(self, slot: _ChildSlot, node: Element,
+                                  num: int) -> List[RowDict]:
+        preamble = {slot.num_key: num}
+        text = node.text
+        if text:
+            if self._text_policy is None:
+                text = text.strip()
+            else:
+                text = self._text_policy.apply(text)
+            if text:
+                if self._dictionaries is not None:
+                    if slot.text_dictionary is None:
+                        slot.text_dictionary = self._dictionaries[
+                            slot.text_key]
+                    text = slot.text_dictionary.intern(text)
+                preamble[slot.text_key] = text
+        row_dicts = self.row_dicts_by_element.get(node)
+        if row_dicts is None:
+            return [preamble]
         return [{**preamble, **rd} for rd in row_dicts]
 
     def _add_new_rows_to_child_tag(
-            self, row_dicts_by_tag: Dict[str, List[RowDict]],
-            tag: str,
+            self, row_dicts_by_slot: Dict[_ChildSlot, List[RowDict]],
+            slot: _ChildSlot,
             new_rows: List[RowDict]):
-        if tag in row_dicts_by_tag:
-            row_dicts_by_tag[tag].extend(new_rows)
+        if slot in row_dicts_by_slot:
+            row_dicts_by_slot[slot].extend(new_rows)
         else:
-            row_dicts_by_tag[tag] = new_rows
+            row_dicts_by_slot[slot] = new_rows
 
-    def _flatten_tags(self, row_dicts_by_tag: Dict[str, List[RowDict]]
+    def _flatten_tags(self, plan: _PathPlan,
+                      row_dicts_by_slot: Dict[_ChildSlot, List[RowDict]]
                       ) -> List[RowDict]:
-        if row_dicts_by_tag:
-            new_rows = self._product_elements(row_dicts_by_tag)
+        if row_dicts_by_slot:
+            new_rows = self._product_elements(plan, row_dicts_by_slot)
         else:
             new_rows = [{}]
         return new_rows
 
-    def _create_attrs(self, path: Path, node: ET.Element) -> RowDict:
-        attrs = {}
-        for attr, value in node.attrib.items():
-            attr_path: Path = path + (("@" + attr),)
-            attrs[attr_path] = value
-        return attrs
+    def _create_attrs(self, plan: _PathPlan, node: ET.Element) -> RowDict:
+        if self._dictionaries is None:
+            return {plan.attr_key(attr): value
+                    for attr, value in node.attrib.items()}
+        return {plan.attr_key(attr): plan.attr_dictionary(attr).intern(value)
+                for attr, value in node.attrib.items()}
 
-    def _product_elements(self, row_dicts_by_tag: Dict[str, List[RowDict]]
+    def _product_elements(self, plan: _PathPlan,
+                          row_dicts_by_slot: Dict[_ChildSlot, List[RowDict]]
                           ) -> List[RowDict]:
         # in most cases: concatenation of rows (each tag once) or a set of rows
         # (n-times a tag)
 
         # first, merge by alias since we multlipy rows of a tag by rows of
         # another tag iff the latter is not an alias of the former.
-        row_dicts_by_tag_or_alias = {}
-        for tag, rd in row_dicts_by_tag.items():
-            row_dicts_by_tag_or_alias.setdefault(self._aliases.get(tag, tag),
-                                                 []).extend(rd)
-
-        list_of_row_dicts: List[List[RowDict]] = list(
-            row_dicts_by_tag_or_alias.values())
+        if plan.has_aliases:
+            row_dicts_by_tag_or_alias = {}
+            for slot, rd in row_dicts_by_slot.items():
+                row_dicts_by_tag_or_alias.setdefault(slot.group,
+                                                     []).extend(rd)
+            list_of_row_dicts: List[List[RowDict]] = list(
+                row_dicts_by_tag_or_alias.values())
+        else:
+            list_of_row_dicts = list(row_dicts_by_slot.values())
         if len(list_of_row_dicts) == 0:
             new_row_dicts = [{}]
         elif len(list_of_row_dicts) == 1:
             new_row_dicts = list_of_row_dicts[0]
         else:
+            # the callback may stop a product that explodes before it is
+            # built
+            self.fan_out = math.prod(len(rds) for rds in list_of_row_dicts)
+            if self._progress is not None:
+                self._progress.check_fan_out(self.fan_out)
             new_row_dicts = [
                 {k: v for row_dict in row_dicts for k, v in row_dict.items()}
                 for row_dicts in
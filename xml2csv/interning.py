@@ -0,0 +1,90 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+from typing import Dict, List, Optional, Tuple, Iterator
+
+MAX_SIZE = 4096
+
+
+class ColumnDictionary:
+    """
+    A bounded dictionary of the values of a column. `intern` returns the
+    first occurrence of a value, so that equal values are the same object,
+    and gives a code to each value. When the dictionary is full, the new
+    values are returned as is, and the dictionary `overflowed`.
+    """
+
+    def __init__(self, max_size: int = MAX_SIZE):
+        self._max_size = max_size
+        self._code_by_value: Dict[str, int] = {}
+        self._values: List[str] = []
+        self.overflowed = False
+
+    def intern(self, value: str) -> str:
+        code = self._code_by_value.get(value)
+        if code is not None:
+            return self._values[code]
+        if len(self._values) < self._max_size:
+            self._code_by_value[value] = len(self._values)
+            self._values.append(value)
+        else:
+            self.overflowed = True
+        return value
+
+    def code(self, value: str) -> Optional[int]:
+        """
+        :return: the code of the value, or None if it was not interned
+        """
+        return self._code_by_value.get(value)
+
+    @property
+    def categories(self) -> List[str]:
+        """
+        :return: the values, by code
+        """
+        return list(self._values)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+class ColumnDictionaries:
+    """
+    The dictionaries of the columns, created on demand. A column is a path
+    and a terminal, as in `find_columns`.
+    """
+
+    def __init__(self, max_size: int = MAX_SIZE):
+        self._max_size = max_size
+        self._dictionary_by_column: Dict[Tuple[str, ...],
+                                         ColumnDictionary] = {}
+
+    def __getitem__(self, column: Tuple[str, ...]) -> ColumnDictionary:
+        dictionary = self._dictionary_by_column.get(column)
+        if dictionary is None:
+            dictionary = ColumnDictionary(self._max_size)
+            self._dictionary_by_column[column] = dictionary
+        return dictionary
+
+    def get(self, column: Tuple[str, ...]) -> Optional[ColumnDictionary]:
+        return self._dictionary_by_column.get(column)
+
+    def __contains__(self, column: Tuple[str, ...]) -> bool:
+        return column in self._dictionary_by_column
+
+    def __iter__(self) -> Iterator[Tuple[str, ...]]:
+        return iter(self._dictionary_by_column)
@@ -19,32 +19,252 @@
 import argparse
 import ast
 import csv
+import os
 import sys
+from io import StringIO
+from typing import Dict, Any, Optional, Callable
 import xml.etree.ElementTree as ET
 
+from _util import make_header, check_options
+from checkpoint import CheckpointedFlattener, CHECKPOINT_EVERY
+from delta import DeltaFlattener
 from dom import ProductFlattener
+from interning import ColumnDictionaries
+from pipeline import Pipeline, PIPELINE_MODES, THREADS
+from profiling import (ProfilingProductFlattener,
+                       ProfilingNoProductFlattener, PROFILE_FORMATS)
+from progress import ProgressReader, ProgressWriter
+from sampling import (SamplingFlattener, APPEND, REWRITE,
+                      LATE_COLUMNS_POLICIES, rewrite_header)
 from sax import NoProductFlattener
+from table import TableFlattener, scan_table
+from textpolicy import TextPolicy, TRUNCATE, TEXT_POLICIES
+from where import FilteringFlattener, parse_where
 
 
 def xml2csv(filename, out=sys.stdout, short_names=False, product=True,
-            aliases=None, number_cols=True, **kwargs):
-    if "dialect" in kwargs:
-        writer = csv.writer(out, kwargs["dialect"])
-    else:
-        writer = csv.writer(out, **kwargs)
+            aliases=None, number_cols=True, columns=None, fast_path=None,
+            sample_size=None, late_columns=APPEND, side_file=None, jobs=None,
+            progress=None, checkpoint=None, checkpoint_every=CHECKPOINT_EVERY,
+            resume=False, writer=None, delta_index=None, delta_key=None,
+            pipeline=None, profile=None, where=None, text_policy=None,
+            intern=False, **kwargs):
+    """
+    :param columns: the columns, if known
+    :param fast_path: True if the document is known to be a table (see
+                      `TableColumnsFinder`), False to use the general
+                      algorithms, None to detect the shape of the document
+    :param sample_size: if not None, find the columns on the first records
+                        only (no product)
+    :param late_columns: the policy for the columns that are not in the
+                         sample (see `SamplingHandler`), or in the index of
+                         a delta (only `REWRITE` accepts them). `REWRITE`
+                         needs `out` to be a file.
+    :param side_file: the path of the side file for the `SIDE` policy
+    :param jobs: if not None, the number of processes used to find the
+                 columns of a file (no product)
+    :param progress: a `Progress` object that counts the bytes read and the
+                     rows written by the conversion
+    :param checkpoint: if not None, the path of the checkpoint file, saved
+                       every `checkpoint_every` records (no product). `out`
+                       must be a seekable file.
+    :param resume: if True, resume the conversion from the checkpoint
+    :param writer: if not None, the CSV writer to use instead of a writer on
+                   `out` (e.g. a `PartWriter`)
+    :param delta_index: if not None, the path of the index of the record
+                        hashes: write only the changes since the previous
+                        run (no product)
+    :param delta_key: the attribute of the records that is the key of the
+                      changes, default is the position
+    :param pipeline: if not None, `THREADS` or `PROCESSES`: parse, flatten
+                     and write in stages (see `Pipeline`)
+    :param profile: if not None, a `Profile` that receives the cost of each
+                    path (the table fast path is disabled)
+    :param where: if not None, a list of expressions (see `parse_where`):
+                  only the records that match all of them are written
+    :param text_policy: if not None, a `TextPolicy` for the long texts (the
+                        table fast path is disabled)
+    :param intern: if True, the equal values of a column are the same
+                   object in the rows held by the product (product only,
+                   see `ColumnDictionaries`). The attribute values are
+                   already those of the tree: this saves the stripped
+                   copies of the texts.
+    """
+    check_options(product, aliases, sample_size, checkpoint, delta_index,
+                  pipeline, profile, where, text_policy, intern,
+                  writer is not None, late_columns == REWRITE)
+    if late_columns == REWRITE and (sample_size is not None
+                                    or delta_index is not None):
+        name = getattr(out, "name", None)
+        if not isinstance(name, str) or not os.path.isfile(name):
+            raise ValueError("Can only rewrite the header of a file")
+    if writer is None:
+        if "dialect" in kwargs:
+            writer = csv.writer(out, kwargs["dialect"])
+        else:
+            writer = csv.writer(out, **kwargs)
+    if where:
+        where = [parse_where(expression) for expression in where]
+
+    if progress is not None:
+        writer = ProgressWriter(writer, progress)
+    try:
+        if delta_index is not None:
+            _delta_xml2csv(
+                filename, out, writer, short_names=short_names,
+                number_cols=number_cols, columns=columns,
+                late_columns=late_columns, delta_index=delta_index,
+                delta_key=delta_key, progress=progress, kwargs=kwargs)
+        elif checkpoint is None:
+            _xml2csv(
+                filename, out, writer, short_names=short_names,
+                product=product, aliases=aliases, number_cols=number_cols,
+                columns=columns, fast_path=fast_path,
+                sample_size=sample_size, late_columns=late_columns,
+                side_file=side_file, jobs=jobs, progress=progress,
+                pipeline=pipeline, profile=profile, where=where,
+                text_policy=text_policy, intern=intern, kwargs=kwargs)
+        else:
+            flattener = CheckpointedFlattener(filename, checkpoint,
+                                              checkpoint_every, short_names,
+                                              number_cols, columns, progress)
+            flattener.flatten(writer, out, resume)
+    finally:
+        if progress is not None:
+            progress.close()
+
+
+def _xml2csv(filename, out, writer, *, short_names, product, aliases,
+             number_cols, columns, fast_path, sample_size, late_columns,
+             side_file, jobs, progress, pipeline, profile, where,
+             text_policy, intern, kwargs):
+    if text_policy is not None or where or profile is not None:
+        fast_path = False
+
+    if pipeline is not None:
+        for batch in Pipeline(pipeline).row_batches(
+                filename, columns, short_names, product, aliases,
+                number_cols, progress):
+            writer.writerows(batch)
+        return
+
+    if sample_size is not None:
+        _sampled_xml2csv(
+            filename, out, writer, short_names=short_names,
+            number_cols=number_cols, sample_size=sample_size,
+            late_columns=late_columns, side_file=side_file,
+            progress=progress, kwargs=kwargs)
+        return
+
+    if (jobs is not None and columns is None and not product
+            and isinstance(filename, str)):
+        # the process pool is imported only when needed
+        from parallel import find_columns as parallel_find_columns
+
+        columns = parallel_find_columns(filename, number_cols, jobs)
+        if fast_path is None:
+            fast_path = False
+
+    if fast_path is not False and not aliases:
+        if columns is None or fast_path is None:
+            # without product, the scan finds the columns even if the
+            # document is not a table: there is no other pass
+            if isinstance(filename, str):
+                table_columns, is_table = scan_table(filename, number_cols,
+                                                     product)
+            else:
+                text = filename.read()
+                table_columns, is_table = scan_table(StringIO(text),
+                                                     number_cols, product)
+                filename = StringIO(text)
+            fast_path = is_table
+            if columns is None:
+                columns = table_columns
+        if fast_path:
+            flattener = TableFlattener(_open_input(filename, progress),
+                                       columns, short_names=short_names)
+            flattener.flatten(writer)
+            return
 
     if product:
-        tree = ET.parse(filename)
-        flattener = ProductFlattener(tree.getroot(), short_names=short_names,
-                                     number_cols=number_cols, aliases=aliases)
+        source = _open_input(filename, progress)
+        try:
+            tree = ET.parse(source)
+        finally:
+            if source is not filename:
+                source.close()
+        dictionaries = ColumnDictionaries() if intern else None
+        if profile is None:
+            flattener = ProductFlattener(
+                tree.getroot(), short_names=short_names,
+                number_cols=number_cols, aliases=aliases, columns=columns,
+                dictionaries=dictionaries, where=where,
+                text_policy=text_policy, progress=progress)
+        else:
+            flattener = ProfilingProductFlattener(
+                tree.getroot(), profile, short_names=short_names,
+                number_cols=number_cols, aliases=aliases, columns=columns,
+                dictionaries=dictionaries, where=where,
+                text_policy=text_policy, progress=progress)
         for r in flattener.flatten():
             writer.writerow(r)
-    elif aliases:
-        raise ValueError("Can ony have aliases with product")
-    else:
+    elif where:
+        flattener = FilteringFlattener(
+            filename, where, short_names=short_names, number_cols=number_cols,
+            columns=columns, progress=progress, text_policy=text_policy)
+        flattener.flatten(writer)
+    elif profile is None:
         flattener = NoProductFlattener(filename, short_names=short_names,
-                                       number_cols=number_cols)
+                                       number_cols=number_cols,
+                                       columns=columns, progress=progress,
+                                       text_policy=text_policy)
         flattener.flatten(writer)
+    else:
+        flattener = ProfilingNoProductFlattener(
+            filename, profile, short_names=short_names,
+            number_cols=number_cols, columns=columns, progress=progress)
+        flattener.flatten(writer)
+
+
+def _open_input(filename, progress):
+    """
+    :return: the file name, or a file that counts the bytes read
+    """
+    if progress is None or not isinstance(filename, str):
+        return filename
+    return ProgressReader(open(filename, "rb"), progress)
+
+
+def _sampled_xml2csv(filename, out, writer, *, short_names, number_cols,
+                     sample_size, late_columns, side_file, progress, kwargs):
+    if side_file is None:
+        flattener = SamplingFlattener(filename, sample_size, late_columns,
+                                      None, short_names, number_cols,
+                                      progress)
+        flattener.flatten(writer)
+    else:
+        with open(side_file, "w", newline="") as side:
+            side_writer = csv.writer(side, **kwargs)
+            flattener = SamplingFlattener(filename, sample_size, late_columns,
+                                          side_writer, short_names,
+                                          number_cols, progress)
+            flattener.flatten(writer)
+
+    if late_columns == REWRITE and flattener.late_columns:
+        out.flush()
+        rewrite_header(out.name, make_header(flattener.columns, short_names),
+                       **kwargs)
+
+
+def _delta_xml2csv(filename, out, writer, *, short_names, number_cols,
+                   columns, late_columns, delta_index, delta_key, progress,
+                   kwargs):
+    flattener = DeltaFlattener(filename, delta_index, delta_key, short_names,
+                               number_cols, columns, late_columns, progress)
+    flattener.flatten(writer)
+    if late_columns == REWRITE and flattener.late_columns:
+        out.flush()
+        rewrite_header(out.name, flattener.header(), **kwargs)
 
 
 class ParseDictAction(argparse.Action):
@@ -57,9 +277,53 @@ class ParseDictAction(argparse.Action):
         setattr(namespace, self.dest, ast.literal_eval(values))
 
 
-def get_parser() -> argparse.ArgumentParser:
-    parser = argparse.ArgumentParser(
-        description='Convert an XML file to a CSV file.')
+def conversion_options(args: argparse.Namespace,
+                       compile_schema: Optional[Callable] = None
+                       ) -> Dict[str, Any]:
+    """
+    :param args: the arguments parsed by `get_parser()`
+    :param compile_schema: if not None, the function that compiles the
+                           `--xsd` file (see `compile_xsd`), e.g. through a
+                           cache
+    :return: the arguments of `xml2csv`, except the output, the writer, the
+             progress and the profile
+    """
+    if args.xsd is None:
+        columns = fast_path = None
+    else:
+        if compile_schema is None:
+            from xsd import compile_xsd as compile_schema
+
+        schema = compile_schema(args.xsd, not args.no_numbers)
+        columns = schema.columns
+        fast_path = schema.is_table() and not args.aliases
+    if args.max_text is None:
+        text_policy = None
+    else:
+        text_policy = TextPolicy(args.max_text, args.text_policy,
+                                 args.spill_dir)
+    return {
+        "short_names": args.short_names, "aliases": args.aliases,
+        "product": not args.no_product, "number_cols": not args.no_numbers,
+        "columns": columns, "fast_path": fast_path,
+        "sample_size": args.sample, "late_columns": args.late_columns,
+        "side_file": args.side_file, "jobs": args.jobs,
+        "checkpoint": args.checkpoint,
+        "checkpoint_every": args.checkpoint_every, "resume": args.resume,
+        "delta_index": args.delta, "delta_key": args.delta_key,
+        "pipeline": args.pipeline, "where": args.where,
+        "text_policy": text_policy, "intern": args.intern,
+    }
+
+
+def get_parser(parser_class=argparse.ArgumentParser, add_help: bool = True
+               ) -> argparse.ArgumentParser:
+    """
+    :param parser_class: the class of the parser, e.g. a parser that
+                         raises an exception instead of exiting on error
+    """
+    parser = parser_class(
+        description='Convert an XML file to a CSV file.', add_help=add_help)
     parser.add_argument('filename', help='a file to convert')
     parser.add_argument('-s', '--short-names',
                         help='use short names for columns', action='store_true')
@@ -70,4 +334,69 @@ def get_parser() -> argparse.ArgumentParser:
                         help="don't use cartesian product", action='store_true')
     parser.add_argument('-n', '--no-numbers',
                         help="don't create number columns for tags", action='store_true')
+    parser.add_argument('-x', '--xsd', default=None,
+                        help='take the columns from this XML schema')
+    parser.add_argument('-j', '--jobs', default=None, type=int,
+                        help='find the columns with JOBS processes '
+                             '(no product only)')
+    parser.add_argument('--progress', default=None, nargs='?', const='bar',
+                        choices=('bar', 'json'),
+                        help='show the progress on stderr, as a bar or as '
+                             'JSON lines')
+    parser.add_argument('--checkpoint', default=None,
+                        help='save checkpoints to this file (no product '
+                             'only)')
+    parser.add_argument('--checkpoint-every', default=CHECKPOINT_EVERY,
+                        type=int, help='the number of records between two '
+                                       'checkpoints')
+    parser.add_argument('--resume', action='store_true',
+                        help='resume the conversion from the checkpoint')
+    parser.add_argument('--delta', default=None, metavar='INDEX',
+                        help='write only the changes since the run that '
+                             'wrote the index (no product)')
+    parser.add_argument('--delta-key', default=None, metavar='ATTR',
+                        help='the attribute of the records that is the key '
+                             'of the changes (default: position)')
+    parser.add_argument('--pipeline', default=None, nargs='?',
+                        const=THREADS, choices=PIPELINE_MODES,
+                        help='parse, flatten and write in threads (default) '
+                             'or processes: faster on several cores only')
+    parser.add_argument('--profile', default=None, choices=PROFILE_FORMATS,
+                        help='report the cost of each path on stderr, as a '
+                             'table or as folded stacks for a flame graph')
+    parser.add_argument('--where', default=None, action='append',
+                        metavar='EXPR',
+                        help='write only the records that match, e.g. '
+                             '\'item/@status == "active"\' (repeat for '
+                             'AND)')
+    parser.add_argument('--max-text', default=None, type=int, metavar='N',
+                        help='bound the texts longer than N characters '
+                             '(see --text-policy)')
+    parser.add_argument('--text-policy', default=TRUNCATE,
+                        choices=TEXT_POLICIES,
+                        help='truncate the long texts, replace them by '
+                             'their SHA-256 or spill them to files')
+    parser.add_argument('--spill-dir', default=None,
+                        help='the directory of the spilled texts (policy '
+                             '"spill")')
+    parser.add_argument('--intern', action='store_true',
+                        help='share the equal values of a column in memory '
+                             '(product only)')
+    parser.add_argument('--split-rows', default=None, type=int,
+                        help='split the output in parts of at most N rows')
+    parser.add_argument('--split-bytes', default=None, type=int,
+                        help='split the output in parts of about N bytes')
+    parser.add_argument('-z', '--compress', action='store_true',
+                        help='gzip the parts')
+    parser.add_argument('-o', '--output', default=None,
+                        help='the output file (default: stdout)')
+    parser.add_argument('--sample', default=None, type=int,
+                        help='find the columns on the first SAMPLE records '
+                             '(no product only)')
+    parser.add_argument('--late-columns', default=APPEND,
+                        choices=LATE_COLUMNS_POLICIES,
+                        help='what to do with the columns that are not in '
+                             'the sample')
+    parser.add_argument('--side-file', default=None,
+                        help='the file for the late columns (policy "side")')
     return parser
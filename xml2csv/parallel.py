@@ -0,0 +1,175 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Optional, Dict, Set
+from xml.parsers import expat
+from xml.sax import make_parser, SAXException
+
+import sax
+from _util import Path
+from sax import SaxColumnsFinder
+
+CHUNK_SIZE = 64 * 1024
+RECORD_TAG_ENDS = (b" ", b"\t", b"\r", b"\n", b">", b"/")
+
+
+class _Located(Exception):
+    pass
+
+
+class _Layout:
+    """
+    The byte offsets of a document: `first_record` is the start of the
+    first child of the root, `footer` the start of the root end tag.
+    """
+
+    def __init__(self, root_tag: str, record_tag: str, first_record: int,
+                 footer: int):
+        self.root_tag = root_tag
+        self.record_tag = record_tag
+        self.first_record = first_record
+        self.footer = footer
+
+
+def _locate(filepath: str) -> Optional[_Layout]:
+    parser = expat.ParserCreate()
+    tags = []
+
+    def start_element(name, _attrs):
+        tags.append(name)
+        if len(tags) == 2:
+            raise _Located()
+
+    parser.StartElementHandler = start_element
+    with open(filepath, "rb") as f:
+        try:
+            for chunk in sax.iter_chunks(f, CHUNK_SIZE):
+                parser.Parse(chunk, False)
+            return None
+        except _Located:
+            first_record = parser.CurrentByteIndex
+
+    with open(filepath, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        footer = data.rfind(b"</" + tags[0].encode("utf-8"))
+    if footer < first_record:
+        return None
+    return _Layout(tags[0], tags[1], first_record, footer)
+
+
+def _split(filepath: str, layout: _Layout, count: int) -> List[int]:
+    """
+    :return: the offsets of the record boundaries, from the first record
+             to the footer
+    """
+    start_tag = b"<" + layout.record_tag.encode("utf-8")
+    boundaries = [layout.first_record]
+    size = layout.footer - layout.first_record
+    with open(filepath, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for i in range(1, count):
+            pos = data.find(start_tag, layout.first_record + i * size // count,
+                            layout.footer)
+            while pos != -1:
+                end = pos + len(start_tag)
+                if data[end:end + 1] in RECORD_TAG_ENDS:
+                    break
+                pos = data.find(start_tag, pos + 1, layout.footer)
+            if pos != -1 and pos > boundaries[-1]:
+                boundaries.append(pos)
+    boundaries.append(layout.footer)
+    return boundaries
+
+
+def _scan(filepath: str, header_end: int, start: int, stop: int,
+          footer: int, number_cols: bool
+          ) -> Optional[Dict[Path, Set[str]]]:
+    """
+    Find the columns of the records between `start` and `stop`, wrapped
+    in the prolog, the root start tag and the root end tag.
+
+    :return: the terminals by path, or None if the part is not well formed
+    """
+    parser = make_parser()
+    handler = SaxColumnsFinder(number_cols)
+    parser.setContentHandler(handler)
+    try:
+        with open(filepath, "rb") as f:
+            parser.feed(f.read(header_end))
+            f.seek(start)
+            remaining = stop - start
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                parser.feed(chunk)
+                remaining -= len(chunk)
+            f.seek(footer)
+            parser.feed(f.read())
+        parser.close()
+    except SAXException:
+        return None
+    return handler.terminals_by_path()
+
+
+def merge_columns(results: List[Dict[Path, Set[str]]]) -> List[Tuple[str]]:
+    """
+    Merge the paths and the terminals found in consecutive parts of a
+    document: the paths are ordered by first occurrence, as in a serial
+    scan.
+    """
+    paths = []
+    terminals_by_path = {}
+    for part_terminals_by_path in results:
+        for path, terminals in part_terminals_by_path.items():
+            if path not in terminals_by_path:
+                paths.append(path)
+                terminals_by_path[path] = set()
+            terminals_by_path[path].update(terminals)
+    return [path + (terminal,) for path in paths for terminal in
+            sorted(terminals_by_path[path])]
+
+
+def find_columns(filepath: str, number_cols: bool = False,
+                 workers: Optional[int] = None) -> List[Tuple[str]]:
+    """
+    Find the columns of a file with a pool of processes. The file is split
+    at the start tags of the records (children of the root), and each part
+    is scanned by a `SaxColumnsFinder`. The result is the same as
+    `sax.find_columns`.
+
+    The file must be encoded in an ASCII compatible encoding. If the file
+    can't be split (e.g. a record tag in a comment), the scan is serial.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    layout = _locate(filepath)
+    if workers <= 1 or layout is None:
+        return sax.find_columns(filepath, number_cols)
+
+    boundaries = _split(filepath, layout, workers)
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(_scan, filepath, layout.first_record,
+                                   start, stop, layout.footer, number_cols)
+                   for start, stop in zip(boundaries, boundaries[1:])]
+        results = [future.result() for future in futures]
+    if None in results:
+        return sax.find_columns(filepath, number_cols)
+    return merge_columns(results)
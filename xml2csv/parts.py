@@ -0,0 +1,187 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import csv
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from typing import Optional, List, Mapping, Any
+
+BUFFER_SIZE = 1024 * 1024
+
+
+class _Part:
+    def __init__(self, path: str, encoding: str):
+        self.path = path
+        self.rows = 0
+        self.bytes = 0
+        self._encoding = encoding
+        self._sha256 = hashlib.sha256()
+        self._f = open(path, "wb")
+
+    def write(self, text: str):
+        data = text.encode(self._encoding)
+        self._f.write(data)
+        self._sha256.update(data)
+        self.bytes += len(data)
+
+    def close(self) -> Mapping[str, Any]:
+        self._f.close()
+        return {
+            "path": os.path.basename(self.path),
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "sha256": self._sha256.hexdigest(),
+        }
+
+
+def _compress(entry: Mapping[str, Any], directory: str) -> Mapping[str, Any]:
+    """
+    Compress a part and remove the CSV file.
+
+    :return: the entry of the compressed part
+    """
+    path = os.path.join(directory, entry["path"])
+    with open(path, "rb") as source, gzip.open(path + ".gz", "wb") as dest:
+        shutil.copyfileobj(source, dest, BUFFER_SIZE)
+    os.remove(path)
+    sha256 = hashlib.sha256()
+    with open(path + ".gz", "rb") as f:
+        for chunk in iter(lambda: f.read(BUFFER_SIZE), b""):
+            sha256.update(chunk)
+    return dict(entry, path=entry["path"] + ".gz",
+                compressed_bytes=os.path.getsize(path + ".gz"),
+                compressed_sha256=sha256.hexdigest())
+
+
+class PartWriter:
+    """
+    A CSV writer that writes the rows to part files of at most `max_rows`
+    rows and about `max_bytes` bytes (a part is closed after the row that
+    reaches the limit). The first row written is the header, and is repeated
+    at the top of each part; it is not counted in the rows.
+
+    The parts of `out.csv` are `out-00000.csv`, `out-00001.csv`, ... When
+    the writer is closed, a manifest `out.manifest.json` lists the parts
+    with their rows, bytes and SHA-256 checksums. The manifest of a
+    conversion that failed has `"complete": false`: the parts hold only
+    the rows written before the failure.
+
+    If `compress` is True, each closed part is gzipped by a background
+    thread while the conversion continues.
+    """
+
+    def __init__(self, path: str, max_rows: Optional[int] = None,
+                 max_bytes: Optional[int] = None, compress: bool = False,
+                 encoding: str = "utf-8", **kwargs):
+        """
+        :param path: the template of the part paths
+        :param kwargs: the format parameters of the CSV writer
+        """
+        if max_rows is None and max_bytes is None:
+            raise ValueError("A maximum number of rows or bytes is needed")
+        self._base, self._ext = os.path.splitext(path)
+        self._directory = os.path.dirname(os.path.abspath(path))
+        self._max_rows = max_rows
+        self._max_bytes = max_bytes
+        self._encoding = encoding
+        self._buffer = StringIO()
+        self._writer = csv.writer(self._buffer, **kwargs)
+        self._header = None
+        self._header_row = []
+        self._part = None
+        self._entries = []
+        if compress:
+            self._executor = ThreadPoolExecutor(1)
+        else:
+            self._executor = None
+
+    @property
+    def manifest_path(self) -> str:
+        return self._base + ".manifest.json"
+
+    def writerow(self, row):
+        text = self._format(row)
+        if self._header is None:
+            self._header = text
+            self._header_row = [str(value) for value in row]
+            return
+
+        if self._part is None:
+            self._open_part()
+        self._part.write(text)
+        self._part.rows += 1
+        if ((self._max_rows is not None
+             and self._part.rows >= self._max_rows)
+                or (self._max_bytes is not None
+                    and self._part.bytes >= self._max_bytes)):
+            self._close_part()
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def _format(self, row) -> str:
+        self._writer.writerow(row)
+        text = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return text
+
+    def _open_part(self):
+        path = "{}-{:05d}{}".format(self._base, len(self._entries), self._ext)
+        self._part = _Part(path, self._encoding)
+        self._part.write(self._header)
+
+    def _close_part(self):
+        entry = self._part.close()
+        if self._executor is not None:
+            entry = self._executor.submit(_compress, entry, self._directory)
+        self._entries.append(entry)
+        self._part = None
+
+    def close(self, complete: bool = True) -> List[Mapping[str, Any]]:
+        """
+        Close the last part, wait for the compressions and write the manifest.
+
+        :param complete: False if the conversion failed
+        :return: the entries of the manifest
+        """
+        if self._part is not None:
+            self._close_part()
+        elif not self._entries and self._header is not None:
+            self._open_part()  # a header only part
+            self._close_part()
+        if self._executor is not None:
+            self._executor.shutdown()
+            entries = [entry.result() for entry in self._entries]
+        else:
+            entries = self._entries
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            json.dump({"header": self._header_row, "complete": complete,
+                       "parts": entries}, f, indent=2)
+        return entries
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close(exc_type is None)
@@ -0,0 +1,179 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import time
+from typing import Dict, List, TextIO
+from xml.etree import ElementTree as ET
+from xml.sax.xmlreader import AttributesImpl
+
+from _util import Path, RowDict
+from dom import ProductFlattener, _ChildSlot, _PathPlan
+from sax import NoProductHandler, NoProductFlattener
+
+TABLE = "table"
+FOLDED = "folded"
+PROFILE_FORMATS = (TABLE, FOLDED)
+
+
+class PathStats:
+    """
+    The cost of a path: the number of elements, the rows produced by the
+    elements, the maximum number of rows of one element (fan-out), the
+    bytes of text and the time spent in the handlers of the elements.
+    """
+    __slots__ = ("count", "rows", "fan_out", "text_bytes", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.rows = 0
+        self.fan_out = 0
+        self.text_bytes = 0
+        self.seconds = 0.0
+
+    def add_rows(self, rows: int):
+        self.rows += rows
+        if rows > self.fan_out:
+            self.fan_out = rows
+
+
+class Profile:
+    """
+    The stats of the paths of a conversion, as a table sorted by time, or
+    as folded stacks (path ; separated, self time in microseconds) for a
+    flame graph.
+    """
+
+    def __init__(self):
+        self.stats_by_path: Dict[Path, PathStats] = {}
+
+    def stats(self, path: Path) -> PathStats:
+        stats = self.stats_by_path.get(path)
+        if stats is None:
+            stats = PathStats()
+            self.stats_by_path[path] = stats
+        return stats
+
+    def sorted_paths(self) -> List[Path]:
+        return sorted(self.stats_by_path,
+                      key=lambda p: self.stats_by_path[p].seconds,
+                      reverse=True)
+
+    def write(self, out: TextIO, profile_format: str = TABLE):
+        if profile_format == TABLE:
+            self.write_table(out)
+        elif profile_format == FOLDED:
+            self.write_folded(out)
+        else:
+            raise ValueError("Unknown profile format: {}".format(
+                profile_format))
+
+    def write_table(self, out: TextIO):
+        total = sum(s.seconds for s in self.stats_by_path.values()) or 1.0
+        rows = [("path", "count", "rows", "fan-out", "text bytes", "seconds",
+                 "%")]
+        for path in self.sorted_paths():
+            s = self.stats_by_path[path]
+            rows.append(("/".join(path), str(s.count), str(s.rows),
+                         str(s.fan_out), str(s.text_bytes),
+                         "{:.6f}".format(s.seconds),
+                         "{:.1f}".format(100 * s.seconds / total)))
+        widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+        for row in rows:
+            out.write("  ".join([row[0].ljust(widths[0])] + [
+                value.rjust(width) for value, width in
+                zip(row[1:], widths[1:])]).rstrip() + "\n")
+
+    def write_folded(self, out: TextIO):
+        for path, s in self.stats_by_path.items():
+            out.write("{} {}\n".format(";".join(path),
+                                       int(s.seconds * 1000000)))
+
+
+class ProfilingHandler(NoProductHandler):
+    """
+    A `NoProductHandler` that measures the cost of each path. The time of
+    an element is the time of its start and end handlers; the rows of an
+    element are the rows written when it ends.
+    """
+
+    def __init__(self, writer, columns, profile: Profile):
+        super().__init__(writer, columns)
+        self._profile = profile
+        self._rows = 0
+
+    def startElement(self, name: str, attrs: AttributesImpl):
+        start = time.perf_counter()
+        super().startElement(name, attrs)
+        stats = self._profile.stats(self._context._path + (name,))
+        stats.count += 1
+        stats.seconds += time.perf_counter() - start
+
+    def endElement(self, name: str):
+        start = time.perf_counter()
+        context = self._context
+        stats = self._profile.stats(context._path + (name,))
+        stats.text_bytes += sum(len(chars.encode("utf-8"))
+                                for chars in self._chars)
+        self._rows = 0
+        super().endElement(name)
+        stats.add_rows(self._rows)
+        stats.seconds += time.perf_counter() - start
+
+    def _write_row(self, row: RowDict):
+        super()._write_row(row)
+        self._rows += 1
+
+
+class ProfilingNoProductFlattener(NoProductFlattener):
+    def __init__(self, filename, profile: Profile, short_names=False,
+                 number_cols=False, columns=None, progress=None):
+        super().__init__(filename, short_names=short_names,
+                         number_cols=number_cols, columns=columns,
+                         progress=progress)
+        self._profile = profile
+
+    def _create_handler(self, writer, columns) -> ProfilingHandler:
+        return ProfilingHandler(writer, columns, self._profile)
+
+
+class ProfilingProductFlattener(ProductFlattener):
+    """
+    A `ProductFlattener` that measures the cost of each path. The time of
+    a node is the time of the product of its children; the rows of a node
+    are the rows of the product.
+    """
+
+    def __init__(self, root: ET.Element, profile: Profile, **kwargs):
+        super().__init__(root, **kwargs)
+        self._profile = profile
+
+    def _flatten_node(self, plan: _PathPlan, node: ET.Element
+                      ) -> List[RowDict]:
+        start = time.perf_counter()
+        row_dicts = super()._flatten_node(plan, node)
+        stats = self._profile.stats(plan.path)
+        stats.add_rows(len(row_dicts))
+        stats.seconds += time.perf_counter() - start
+        return row_dicts
+
+    def _rows_with_preamble_added(self, slot: _ChildSlot, node: ET.Element,
+                                  num: int) -> List[RowDict]:
+        stats = self._profile.stats(slot.path)
+        stats.count += 1
+        if node.text:
+            stats.text_bytes += len(node.text.encode("utf-8"))
+        return super()._rows_with_preamble_added(slot, node, num)
@@ -0,0 +1,203 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import datetime
+import json
+import time
+from typing import Optional, Callable, Mapping, Any, TextIO
+
+ROWS_PER_CHECK = 1024
+LARGE_FAN_OUT = 10000
+BAR_WIDTH = 30
+
+Snapshot = Mapping[str, Any]
+
+
+class Progress:
+    """
+    Count the bytes read and the rows written, and call the callback with
+    a snapshot (see `snapshot`) at most every `interval` seconds, and once
+    at the end. The callback may raise an exception to stop the
+    conversion.
+
+    The current depth and product fan-out are read on the watched object,
+    if any (see `watch`). The stages that neither read bytes nor write rows
+    (e.g. the product flatten) call `check` to report on time.
+    """
+
+    def __init__(self, total_bytes: Optional[int] = None,
+                 callback: Callable[[Snapshot], None] = None,
+                 interval: float = 1.0):
+        self.total_bytes = total_bytes
+        self.bytes_read = 0
+        self.rows = 0
+        self._callback = callback
+        self._interval = interval
+        self._watched = None
+        self._start = time.monotonic()
+        self._last = self._start
+        self._countdown = ROWS_PER_CHECK
+
+    def watch(self, obj):
+        """
+        :param obj: an object having a `depth` and/or a `fan_out` attribute
+        """
+        self._watched = obj
+
+    def add_bytes(self, count: int):
+        self.bytes_read += count
+        self.check()
+
+    def add_rows(self, count: int = 1):
+        self.rows += count
+        self._countdown -= count
+        if self._countdown <= 0:
+            self._countdown = ROWS_PER_CHECK
+            self.check()
+
+    def check_fan_out(self, fan_out: int):
+        """
+        Report now if a product of `fan_out` rows is about to be built, and
+        is large: the callback may stop the conversion before the product
+        takes the memory.
+        """
+        if fan_out >= LARGE_FAN_OUT:
+            self._last = time.monotonic()
+            self.report(self._last)
+        else:
+            self.check()
+
+    def check(self):
+        """
+        Report if `interval` seconds have passed since the last report.
+        """
+        now = time.monotonic()
+        if now - self._last >= self._interval:
+            self._last = now
+            self.report(now)
+
+    def report(self, now: Optional[float] = None):
+        if self._callback is not None:
+            self._callback(self.snapshot(now))
+
+    def close(self):
+        self.report()
+
+    def snapshot(self, now: Optional[float] = None) -> Snapshot:
+        if now is None:
+            now = time.monotonic()
+        elapsed = now - self._start
+        if elapsed > 0:
+            bytes_per_s = self.bytes_read / elapsed
+            rows_per_s = self.rows / elapsed
+        else:
+            bytes_per_s = rows_per_s = 0.0
+        if self.total_bytes is None or bytes_per_s == 0:
+            eta = None
+        else:
+            eta = max(self.total_bytes - self.bytes_read, 0) / bytes_per_s
+        return {
+            "elapsed": elapsed,
+            "bytes": self.bytes_read,
+            "total_bytes": self.total_bytes,
+            "rows": self.rows,
+            "mb_per_s": bytes_per_s / (1024 * 1024),
+            "rows_per_s": rows_per_s,
+            "eta": eta,
+            "depth": getattr(self._watched, "depth", None),
+            "fan_out": getattr(self._watched, "fan_out", None),
+        }
+
+
+class ProgressReader:
+    """
+    A binary file that counts the bytes read.
+    """
+
+    def __init__(self, f, progress: Progress):
+        self._f = f
+        self._progress = progress
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._f.read(size)
+        self._progress.add_bytes(len(data))
+        return data
+
+    def close(self):
+        self._f.close()
+
+
+class ProgressWriter:
+    """
+    A CSV writer that counts the rows written.
+    """
+
+    def __init__(self, writer, progress: Progress):
+        self._writer = writer
+        self._progress = progress
+
+    def writerow(self, row):
+        self._writer.writerow(row)
+        self._progress.add_rows()
+
+    def writerows(self, rows):
+        rows = list(rows)
+        self._writer.writerows(rows)
+        self._progress.add_rows(len(rows))
+
+
+class JsonLinesReporter:
+    """
+    Write each snapshot as a JSON line.
+    """
+
+    def __init__(self, out: TextIO):
+        self._out = out
+
+    def __call__(self, snapshot: Snapshot):
+        self._out.write(json.dumps(snapshot) + "\n")
+        self._out.flush()
+
+
+class BarReporter:
+    """
+    Draw a progress bar on a terminal.
+    """
+
+    def __init__(self, out: TextIO):
+        self._out = out
+
+    def __call__(self, snapshot: Snapshot):
+        total = snapshot["total_bytes"]
+        if total:
+            ratio = min(snapshot["bytes"] / total, 1.0)
+            done = int(ratio * BAR_WIDTH)
+            bar = "[{}{}] {:5.1f}%".format("#" * done, " " * (BAR_WIDTH - done),
+                                           ratio * 100)
+        else:
+            bar = "{} bytes".format(snapshot["bytes"])
+        if snapshot["eta"] is None:
+            eta = "?"
+        else:
+            eta = str(datetime.timedelta(seconds=int(snapshot["eta"])))
+        self._out.write("\r{} {:.1f} MB/s {:.0f} rows/s ETA {} ".format(
+            bar, snapshot["mb_per_s"], snapshot["rows_per_s"], eta))
+        self._out.flush()
+
+    def close(self):
+        self._out.write("\n")
+        self._out.flush()
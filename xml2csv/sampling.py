@@ -0,0 +1,181 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import csv
+import os
+import tempfile
+from io import StringIO
+from typing import List, Tuple, Union
+from xml.sax import make_parser
+
+from _util import NUM, DEFAULT, RowDict
+from sax import SaxColumnsFinder, NoProductHandler, NoProductFlattener
+
+APPEND = "append"
+SIDE = "side"
+REWRITE = "rewrite"
+LATE_COLUMNS_POLICIES = (APPEND, SIDE, REWRITE)
+
+
+class _SampleComplete(Exception):
+    pass
+
+
+class SamplingColumnsFinder(SaxColumnsFinder):
+    """
+    A `SaxColumnsFinder` that stops after the first records (children of
+    the root).
+    """
+
+    def __init__(self, sample_size: int, number_cols: bool = False):
+        super().__init__(number_cols)
+        self._sample_size = sample_size
+        self._record_count = 0
+
+    def endElement(self, name: str):
+        super().endElement(name)
+        if len(self._cur_path) == 1:
+            self._record_count += 1
+            if self._record_count >= self._sample_size:
+                raise _SampleComplete()
+
+
+def sample_columns(filepath: Union[str, StringIO], sample_size: int,
+                   number_cols: bool = False) -> List[Tuple[str]]:
+    """
+    :return: the columns of the first `sample_size` records
+    """
+    parser = make_parser()
+    handler = SamplingColumnsFinder(sample_size, number_cols)
+    parser.setContentHandler(handler)
+    try:
+        parser.parse(filepath)
+    except _SampleComplete:
+        pass
+    return handler.columns()
+
+
+class SamplingHandler(NoProductHandler):
+    """
+    A `NoProductHandler` for columns that were found on a sample. The
+    columns that were not in the sample (late columns) are:
+
+    * `APPEND` or `REWRITE`: appended at the end of the row. The rows
+      written before are shorter and the header lacks the late columns
+      (see `rewrite_header`);
+    * `SIDE`: written to a side writer, as `row index, column, value`.
+    """
+
+    def __init__(self, writer, columns: List[Tuple[str]], number_cols: bool,
+                 policy: str = APPEND, side_writer=None):
+        if policy not in LATE_COLUMNS_POLICIES:
+            raise ValueError("Unknown late columns policy: {}".format(policy))
+        if policy == SIDE and side_writer is None:
+            raise ValueError("A side writer is needed")
+        super().__init__(writer, list(columns))
+        self._number_cols = number_cols
+        self._policy = policy
+        self._side_writer = side_writer
+        self._known = set(columns)
+        self._row_index = 0
+        self.late_columns: List[Tuple[str]] = []
+
+    @property
+    def columns(self) -> List[Tuple[str]]:
+        return self._columns
+
+    def _write_row(self, row: RowDict):
+        late_columns = [c for c in row if c not in self._known and (
+                self._number_cols or c[-1] != NUM)]
+        if late_columns:
+            self._known.update(late_columns)
+            self.late_columns.extend(late_columns)
+            if self._policy != SIDE:
+                self._columns.extend(late_columns)
+        if self._policy == SIDE:
+            for c in self.late_columns:
+                if c in row:
+                    self._side_writer.writerow(
+                        [self._row_index, ".".join(c), row[c]])
+        super()._write_row(row)
+        self._row_index += 1
+
+
+class SamplingFlattener(NoProductFlattener):
+    """
+    A `NoProductFlattener` that finds the columns on the first records.
+    After the conversion, `late_columns` holds the columns that were not in
+    the sample.
+    """
+
+    def __init__(self, filename, sample_size: int, policy: str = APPEND,
+                 side_writer=None, short_names=False, number_cols=False,
+                 progress=None):
+        super().__init__(filename, short_names=short_names,
+                         number_cols=number_cols, progress=progress)
+        self._sample_size = sample_size
+        self._policy = policy
+        self._side_writer = side_writer
+        self._handler = None
+
+    @property
+    def late_columns(self) -> List[Tuple[str]]:
+        return [] if self._handler is None else self._handler.late_columns
+
+    @property
+    def columns(self) -> List[Tuple[str]]:
+        """
+        :return: the columns of the sample, then the late columns
+        """
+        return [] if self._handler is None else self._handler.columns
+
+    def _find_columns(self, source) -> List[Tuple[str]]:
+        return sample_columns(source, self._sample_size, self._number_cols)
+
+    def _create_handler(self, writer, columns: List[Tuple[str]]
+                        ) -> SamplingHandler:
+        self._handler = SamplingHandler(writer, columns, self._number_cols,
+                                        self._policy, self._side_writer)
+        return self._handler
+
+
+def rewrite_header(path: str, header: List[str], encoding: str = "utf-8",
+                   **kwargs):
+    """
+    Replace the header of a CSV file and pad the rows that are shorter than
+    the header. The file is rewritten, but there is no XML parsing.
+
+    :param kwargs: the format parameters of the CSV file
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".csv")
+    try:
+        with open(path, newline="", encoding=encoding) as source, \
+                os.fdopen(fd, "w", newline="", encoding=encoding) as dest:
+            reader = csv.reader(source, **kwargs)
+            writer = csv.writer(dest, **kwargs)
+            next(reader, None)
+            writer.writerow(header)
+            width = len(header)
+            for row in reader:
+                if len(row) < width:
+                    row.extend([DEFAULT] * (width - len(row)))
+                writer.writerow(row)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
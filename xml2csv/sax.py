@@ -15,15 +15,21 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
-import collections
 import io
 from io import StringIO
-from typing import Optional, List, Union, Tuple, Mapping
+from typing import (Optional, List, Union, Tuple, Mapping, Iterator, IO, Dict,
+                    Set, TYPE_CHECKING)
 from xml.sax import make_parser
 from xml.sax.handler import ContentHandler
 from xml.sax.xmlreader import AttributesImpl
 
-from _util import TEXT, NUM, ATTR, DEFAULT, make_header
+from _util import TEXT, NUM, ATTR, DEFAULT, RowDict, Path, make_header
+
+if TYPE_CHECKING:
+    from textpolicy import TextPolicy
+
+CHUNK_SIZE = 64 * 1024
+POOL_SIZE = 1024
 
 
 class SaxColumnsFinder(ContentHandler):
@@ -71,6 +77,12 @@ class SaxColumnsFinder(ContentHandler):
         return [path + (terminal,) for path in self._paths for terminal in
                 sorted(self._terminals_by_path[path])]
 
+    def terminals_by_path(self) -> Dict[Path, Set[str]]:
+        """
+        :return: the terminals of each path, the paths in DFS order
+        """
+        return {path: self._terminals_by_path[path] for path in self._paths}
+
 
 def find_columns(filepath: Union[str, io.StringIO],
                  number_cols: bool = False) -> List[Tuple[str]]:
@@ -82,78 +94,180 @@ def find_columns(filepath: Union[str, io.StringIO],
 
 
 class NoProductHandler(ContentHandler):
-    def __init__(self, writer, columns):
+    """
+    Write the rows while parsing. The contexts of the finished non terminal
+    elements and of their terminal children are recycled: at most
+    `pool_size` contexts are kept in a free list (0 to disable).
+    """
+
+    def __init__(self, writer, columns, pool_size: int = POOL_SIZE,
+                 text_policy: Optional["TextPolicy"] = None):
+        """
+        :param text_policy: if not None, the policy for the long texts: the
+                            text is never fully buffered
+        """
         super().__init__()
         self._writer = writer
         self._columns = columns
-        self._chars = []
+        self._text_policy = text_policy
+        if text_policy is None:
+            self._chars = []
+        else:
+            self._chars = text_policy.new_buffer()
         self._context: Optional[Context] = None
+        self._pool: List[Context] = []
+        self._pool_size = pool_size
+
+    @property
+    def depth(self) -> int:
+        return 0 if self._context is None else len(self._context._path) + 1
 
     def startElement(self, name: str, attrs: AttributesImpl):
+        attrs = dict(attrs) if len(attrs) else NO_ATTRS
         if self._context is None:
-            self._context = Context(tuple(), name, dict(attrs), 0)
+            self._context = Context(tuple(), name, attrs, 0)
         else:
-            self._context = self._context.new_child(name, dict(attrs))
+            self._context = self._context.new_child(name, attrs, self._pool)
 
     def endElement(self, name: str):
-        assert self._context is not None
-        text = "".join(self._chars).strip()
-        self._context.add_text(text)
-        if self._context.is_terminal():
-            self._context.parent.store_terminal_child(self._context)
+        context = self._context
+        assert context is not None
+        if self._chars:
+            if self._text_policy is None:
+                context.add_text("".join(self._chars).strip())
+                self._chars.clear()
+            else:
+                context.add_text(self._chars.pop_value())
+        else:
+            context.add_text("")
+        self._context = context.parent
+        if context.is_terminal():
+            context.parent.store_terminal_child(context)
         else:  # non terminal context
             all_terminals = False
-            for name, contexts in self._context.terminal_children.items():
+            for name, contexts in context.terminal_children.items():
                 if len(contexts) == 1:  # terminal to merge
                     all_terminals = True
-                    self._context.add_associated_tag(contexts[0])
+                    context.add_associated_tag(contexts[0])
 
-            for name, contexts in self._context.terminal_children.items():
+            for name, contexts in context.terminal_children.items():
                 if len(contexts) != 1:  # terminals to write
                     all_terminals = False
-                    for i, context in enumerate(contexts):
-                        context._num = i
-                        row = context.row()
-                        self._writer.writerow(
-                            [row.get(c, DEFAULT) for c in self._columns])
+                    for i, child in enumerate(contexts):
+                        child._num = i
+                        self._write_row(child.row())
 
             if all_terminals:
-                row = self._context.row()
-                self._writer.writerow(
-                    [row.get(c, DEFAULT) for c in self._columns])
-
-        self._context = self._context.parent
-        self._chars = []
+                self._write_row(context.row())
+            self._recycle(context)
 
     def characters(self, content: str):
         self._chars.append(content)
 
+    def skip_element(self, name: str):
+        """
+        Count a child of the current element that is not parsed: the
+        numbers of the next siblings are the same as if it had been parsed.
+        """
+        self._context.skip_child(name)
+        self._chars.clear()
+
+    def _write_row(self, row: RowDict):
+        self._writer.writerow([row.get(c, DEFAULT) for c in self._columns])
+
+    def _recycle(self, context: "Context"):
+        """
+        Put a finished non terminal context and its terminal children in the
+        free list.
+        """
+        pool = self._pool
+        for contexts in context.terminal_children.values():
+            for child in contexts:
+                if len(pool) >= self._pool_size:
+                    return
+                child.clear()
+                pool.append(child)
+        if len(pool) < self._pool_size:
+            context.clear()
+            pool.append(context)
+
+
+NO_ATTRS: Mapping[str, str] = {}  # shared, never modified
+_NO_CHILDREN: Mapping[str, List["Context"]] = {}  # shared, never modified
+
 
 class Context:
+    """
+    The state of an element. There is a context per element, hence the
+    `__slots__` and the containers created on demand.
+    """
+    __slots__ = ("_path", "_name", "_attrs", "_terminal_children_by_name",
+                 "parent", "_terminal", "_text", "_associated_tags", "_num",
+                 "_count_by_name", "_child_path")
+
     def __init__(self, path: Tuple[str, ...], name: str,
                  attrs: Mapping[str, str], num: int):
+        self.reset(path, name, attrs, num)
+
+    def reset(self, path: Tuple[str, ...], name: str,
+              attrs: Mapping[str, str], num: int):
         self._path = path
         self._name = name
         self._attrs = attrs
-        self._terminal_children_by_name = {}
+        self._terminal_children_by_name: Optional[
+            Dict[str, List[Context]]] = None
         self.parent: Optional["Context"] = None
         self._terminal = True
         self._text = None
-        self._associated_tags: List[Context] = []
+        self._associated_tags: Optional[List[Context]] = None
         self._num = num
-        self._count_by_name = collections.Counter()
-
-    def new_child(self, name: str, attrs: Mapping[str, str]) -> "Context":
+        self._count_by_name: Optional[Dict[str, int]] = None
+        self._child_path: Optional[Tuple[str, ...]] = None
+
+    def clear(self):
+        """
+        Drop the references of a finished context.
+        """
+        self.reset((), "", NO_ATTRS, 0)
+
+    def new_child(self, name: str, attrs: Mapping[str, str],
+                  pool: Optional[List["Context"]] = None) -> "Context":
+        """
+        :param pool: a free list of contexts to reuse
+        """
         self._terminal = False
-        child_path = self._path + (self._name,)
-        context = Context(child_path, name, attrs, self._count_by_name[name])
-        self._count_by_name[name] += 1
+        child_path = self._child_path
+        if child_path is None:
+            child_path = self._child_path = self._path + (self._name,)
+        count_by_name = self._count_by_name
+        if count_by_name is None:
+            count_by_name = self._count_by_name = {}
+        num = count_by_name.get(name, 0)
+        count_by_name[name] = num + 1
+        if pool:
+            context = pool.pop()
+            context.reset(child_path, name, attrs, num)
+        else:
+            context = Context(child_path, name, attrs, num)
         context.parent = self
         return context
 
+    def skip_child(self, name: str):
+        """
+        Count a child that is not parsed.
+        """
+        self._terminal = False
+        if self._count_by_name is None:
+            self._count_by_name = {name: 1}
+        else:
+            self._count_by_name[name] = self._count_by_name.get(name, 0) + 1
+
     def store_terminal_child(self, context: "Context"):
-        self._terminal_children_by_name.setdefault(context._name, []).append(
-            context)
+        if self._terminal_children_by_name is None:
+            self._terminal_children_by_name = {context._name: [context]}
+        else:
+            self._terminal_children_by_name.setdefault(context._name,
+                                                       []).append(context)
 
     def is_terminal(self):
         return self._terminal
@@ -162,10 +276,15 @@ class Context:
         self._text = text
 
     def add_associated_tag(self, context: "Context"):
-        self._associated_tags.append(context)
+        if self._associated_tags is None:
+            self._associated_tags = [context]
+        else:
+            self._associated_tags.append(context)
 
     @property
-    def terminal_children(self) -> Mapping[str, "Context"]:
+    def terminal_children(self) -> Mapping[str, List["Context"]]:
+        if self._terminal_children_by_name is None:
+            return _NO_CHILDREN
         return self._terminal_children_by_name
 
     def row(self):
@@ -174,9 +293,10 @@ class Context:
         while c is not None:
             path = c._path + (c._name,)
             self.aggregate_context(d, c, path)
-            for t in c._associated_tags:
-                path = t._path + (t._name,)
-                self.aggregate_context(d, t, path)
+            if c._associated_tags is not None:
+                for t in c._associated_tags:
+                    path = t._path + (t._name,)
+                    self.aggregate_context(d, t, path)
             c = c.parent
         return d
 
@@ -194,13 +314,111 @@ class Context:
                                                                      self._text)
 
 
+START_ELEMENT = 0
+END_ELEMENT = 1
+CHARACTERS = 2
+
+
+class EventRecorder(ContentHandler):
+    """
+    A content handler that records the events, to replay them on another
+    handler.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.events: List[Tuple[int, str, Optional[AttributesImpl]]] = []
+
+    def startElement(self, name: str, attrs: AttributesImpl):
+        self.events.append((START_ELEMENT, name, attrs))
+
+    def endElement(self, name: str):
+        self.events.append((END_ELEMENT, name, None))
+
+    def characters(self, content: str):
+        self.events.append((CHARACTERS, content, None))
+
+    def replay(self, handler: ContentHandler):
+        replay_events(self.events, handler)
+
+    def clear(self):
+        self.events = []
+
+    def pop_events(self) -> List[Tuple[int, str, Optional[AttributesImpl]]]:
+        events = self.events
+        self.events = []
+        return events
+
+
+def replay_events(events: List[Tuple[int, str, Optional[AttributesImpl]]],
+                  handler: ContentHandler):
+    """
+    Replay the events recorded by an `EventRecorder`.
+    """
+    for kind, value, attrs in events:
+        if kind == START_ELEMENT:
+            handler.startElement(value, attrs)
+        elif kind == END_ELEMENT:
+            handler.endElement(value)
+        else:
+            handler.characters(value)
+
+
+class RowBuffer:
+    """
+    A writer that keeps the rows until they are popped.
+    """
+
+    def __init__(self):
+        self.rows = []
+
+    def writerow(self, row):
+        self.rows.append(row)
+
+    def pop_rows(self) -> List[list]:
+        rows = self.rows
+        self.rows = []
+        return rows
+
+
+def iter_chunks(source: Union[str, IO], chunk_size: int = CHUNK_SIZE
+                ) -> Iterator[Union[bytes, str]]:
+    """
+    :param source: a file name or a file object
+    :return: the chunks of the file
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            yield from iter_chunks(f, chunk_size)
+    else:
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
 class NoProductFlattener:
-    def __init__(self, filename, short_names=False, number_cols=False):
+    def __init__(self, filename, short_names=False, number_cols=False,
+                 columns: List[Tuple[str]] = None, progress=None,
+                 text_policy: Optional["TextPolicy"] = None):
         self._filename = filename
+        self._text_policy = text_policy
         self._short_names = short_names
         self._number_cols = number_cols
+        self._columns = columns
+        self._progress = progress
 
     def flatten(self, writer):
+        for row in self.rows():
+            writer.writerow(row)
+
+    def rows(self) -> Iterator[list]:
+        """
+        :return: the header, then the rows, lazily: the parser is fed chunk
+                 by chunk, and the rows are yielded as soon as they are
+                 produced.
+        """
         if isinstance(self._filename, str):
             f1 = f2 = self._filename
         else:
@@ -208,11 +426,30 @@ class NoProductFlattener:
             f1 = StringIO(text)
             f2 = StringIO(text)
 
-        parser = make_parser()
-        columns = find_columns(f1, self._number_cols)
-        header = make_header(columns, self._short_names)
-        writer.writerow(header)
+        columns = self._columns
+        if columns is None:
+            columns = self._find_columns(f1)
+        yield make_header(columns, self._short_names)
 
-        handler = NoProductHandler(writer, columns)
+        buffer = RowBuffer()
+        parser = make_parser()
+        handler = self._create_handler(buffer, columns)
         parser.setContentHandler(handler)
-        parser.parse(f2)
+        progress = self._progress
+        if progress is not None:
+            progress.watch(handler)
+        for chunk in iter_chunks(f2):
+            parser.feed(chunk)
+            if progress is not None:
+                progress.add_bytes(len(chunk))
+            yield from buffer.pop_rows()
+        parser.close()
+        yield from buffer.pop_rows()
+
+    def _find_columns(self, source) -> List[Tuple[str]]:
+        return find_columns(source, self._number_cols)
+
+    def _create_handler(self, writer, columns: List[Tuple[str]]
+                        ) -> ContentHandler:
+        return NoProductHandler(writer, columns,
+                                text_policy=self._text_policy)
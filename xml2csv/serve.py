@@ -0,0 +1,240 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import argparse
+import io
+import os
+import shlex
+import socketserver
+import sys
+from typing import Dict, List, Tuple, TextIO, Optional, TYPE_CHECKING
+
+from main import xml2csv, get_parser, conversion_options
+from sampling import REWRITE
+from table import scan_table
+
+if TYPE_CHECKING:
+    from xsd import CompiledSchema
+
+CHUNK_SIZE = 64 * 1024
+MAX_CACHED_SCHEMAS = 128
+ENCODING = "utf-8"
+# the options that need a file or a terminal: not in serve mode
+UNSUPPORTED_OPTIONS = {
+    "output": "--output", "split_rows": "--split-rows",
+    "split_bytes": "--split-bytes", "compress": "--compress",
+    "progress": "--progress", "profile": "--profile",
+    "checkpoint": "--checkpoint", "resume": "--resume",
+}
+
+
+class _RequestParser(argparse.ArgumentParser):
+    """
+    A parser that raises a `ValueError` instead of printing to stderr and
+    exiting.
+    """
+
+    def error(self, message: str):
+        raise ValueError(message)
+
+
+class ChunkedWriter:
+    """
+    A text stream that sends the data in frames: the length of the frame
+    (in bytes, once encoded) on a line, then the data. An empty frame
+    ("0\\n") ends the response.
+    """
+
+    def __init__(self, out: TextIO, chunk_size: int = CHUNK_SIZE,
+                 encoding: str = ENCODING):
+        self._out = out
+        self._chunk_size = chunk_size
+        self._encoding = encoding
+        self._buffer = []
+        self._size = 0
+
+    def write(self, s: str):
+        self._buffer.append(s)
+        self._size += len(s)
+        if self._size >= self._chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            data = "".join(self._buffer)
+            self._out.write("{}\n{}".format(
+                len(data.encode(self._encoding)), data))
+            self._buffer = []
+            self._size = 0
+        self._out.flush()
+
+    def close(self):
+        self.flush()
+        self._out.write("0\n")
+        self._out.flush()
+
+
+class Server:
+    """
+    A long running converter. Each request is a line holding the arguments
+    of the command line (see `get_parser()`), the response is the CSV file,
+    sent by a `ChunkedWriter`. If the request fails, the response is a
+    line "!" followed by the error message. The options that write files
+    or to the terminal (see `UNSUPPORTED_OPTIONS`) are rejected.
+
+    The modules are imported once, and the columns of the files and the
+    compiled schemas are kept between requests, until the file is
+    modified. In product mode, only the shape is kept: the columns are
+    found on the tree of the conversion.
+    """
+
+    def __init__(self):
+        self._parser = get_parser(_RequestParser, add_help=False)
+        self._columns_by_key: Dict[
+            Tuple, Tuple[Optional[List[Tuple[str]]], bool]] = {}
+        self._schemas_by_key: Dict[Tuple, "CompiledSchema"] = {}
+
+    def serve(self, in_stream: TextIO, out_stream: TextIO):
+        for line in in_stream:
+            line = line.strip()
+            if line:
+                self.handle(line, out_stream)
+
+    def handle(self, line: str, out_stream: TextIO):
+        try:
+            args = self._parser.parse_args(shlex.split(line))
+        except (ValueError, SyntaxError):
+            out_stream.write("!invalid request: {}\n".format(line))
+            out_stream.flush()
+            return
+        unsupported = [option for name, option in UNSUPPORTED_OPTIONS.items()
+                       if getattr(args, name) not in (None, False)]
+        if args.late_columns == REWRITE:
+            unsupported.append("--late-columns rewrite")
+        if unsupported:
+            out_stream.write("!unsupported in serve mode: {}\n".format(
+                ", ".join(unsupported)))
+            out_stream.flush()
+            return
+
+        writer = ChunkedWriter(out_stream)
+        try:
+            options = conversion_options(args, self._schema)
+            if (options["columns"] is None and args.sample is None
+                    and args.delta is None):
+                columns, table = self._columns(
+                    args.filename, options["product"],
+                    options["number_cols"], args.jobs)
+                options["columns"] = columns
+                options["fast_path"] = table and not args.aliases
+            xml2csv(args.filename, writer, delimiter="\t", **options)
+        except Exception as e:
+            writer.flush()
+            out_stream.write("!{}\n".format(str(e).replace("\n", " ")))
+            out_stream.flush()
+        else:
+            writer.close()
+
+    def _columns(self, filename: str, product: bool, number_cols: bool,
+                 jobs: Optional[int] = None
+                 ) -> Tuple[Optional[List[Tuple[str]]], bool]:
+        """
+        :param jobs: if not None, the number of processes used to find the
+                     columns (no product)
+        :return: the columns (None if the document is not a table, with
+                 product), and True if the document is a table
+        """
+        key = _file_key(filename) + (product, number_cols)
+        try:
+            return self._columns_by_key[key]
+        except KeyError:
+            pass
+
+        if jobs is not None and not product:
+            from parallel import find_columns
+
+            columns, table = find_columns(filename, number_cols, jobs), False
+        else:
+            columns, table = scan_table(filename, number_cols, product)
+        _put(self._columns_by_key, key, (columns, table))
+        return columns, table
+
+    def _schema(self, filename: str, number_cols: bool) -> "CompiledSchema":
+        """
+        :return: the compiled XSD file
+        """
+        key = _file_key(filename) + (number_cols,)
+        try:
+            return self._schemas_by_key[key]
+        except KeyError:
+            pass
+
+        from xsd import compile_xsd
+
+        schema = compile_xsd(filename, number_cols)
+        _put(self._schemas_by_key, key, schema)
+        return schema
+
+
+def _file_key(filename: str) -> Tuple:
+    """
+    :return: a key that changes when the file is modified
+    """
+    stat = os.stat(filename)
+    return os.path.realpath(filename), stat.st_mtime_ns, stat.st_size
+
+
+def _put(cache: Dict, key: Tuple, value):
+    if len(cache) >= MAX_CACHED_SCHEMAS:
+        del cache[next(iter(cache))]
+    cache[key] = value
+
+
+class _UnixRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        in_stream = io.TextIOWrapper(self.rfile, encoding=ENCODING)
+        out_stream = io.TextIOWrapper(self.wfile, encoding=ENCODING,
+                                      newline="")
+        self.server.converter.serve(in_stream, out_stream)
+        out_stream.flush()
+
+
+def serve_unix(path: str, server: Server = None):
+    with socketserver.UnixStreamServer(path, _UnixRequestHandler) as s:
+        s.converter = Server() if server is None else server
+        try:
+            s.serve_forever()
+        finally:
+            os.unlink(path)
+
+
+def get_serve_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='xml2csv serve',
+        description='Convert XML files to CSV files on request.')
+    parser.add_argument('-u', '--socket', default=None,
+                        help='listen on this unix socket instead of stdin')
+    return parser
+
+
+def serve(argv: List[str]):
+    args = get_serve_parser().parse_args(argv)
+    if args.socket is None:
+        sys.stdout.reconfigure(encoding=ENCODING)
+        Server().serve(sys.stdin, sys.stdout)
+    else:
+        serve_unix(args.socket)
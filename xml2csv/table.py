@@ -0,0 +1,254 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+from io import StringIO
+from typing import List, Tuple, Optional, Union, Dict
+from xml.sax import make_parser
+from xml.sax.handler import ContentHandler
+from xml.sax.xmlreader import AttributesImpl
+
+from _util import TEXT, NUM, ATTR, DEFAULT, make_header
+from sax import SaxColumnsFinder
+
+BATCH_SIZE = 1024
+
+
+class _NotATable(Exception):
+    pass
+
+
+class TableColumnsFinder(SaxColumnsFinder):
+    """
+    A `SaxColumnsFinder` that checks if the document is a table, that is a
+    root, with records having the same tag, and each record having fields
+    (terminal elements) with distinct tags. The root and the records may
+    have attributes, but no text.
+
+    With `product`, the finder stops as soon as the document is not a
+    table, and the paths are registered at their first start tag, as in
+    `DomColumnsFinder`. Without `product`, the finder goes to the end and
+    the columns are those of `sax.find_columns`. In both cases, the table
+    fast path gives the same output as the general algorithm.
+    """
+
+    def __init__(self, number_cols: bool = False, product: bool = False):
+        super().__init__(number_cols)
+        self._product = product
+        self.is_table = True
+        self._record_tag = None
+        self._record_count = 0
+        self._field_tags = set()
+
+    def _not_a_table(self):
+        if self._product:
+            raise _NotATable()
+        self.is_table = False
+
+    def startElement(self, name: str, attrs: AttributesImpl):
+        if self.is_table:
+            self._check_start(name)
+        super().startElement(name, attrs)
+        if self._product:
+            path = tuple(self._cur_path)
+            if path not in self._terminals_by_path:
+                self._paths.append(path)
+                self._terminals_by_path[path] = set()
+
+    def _check_start(self, name: str):
+        depth = len(self._cur_path)
+        if depth == 1:
+            if self._record_tag is None:
+                self._record_tag = name
+            elif name != self._record_tag:
+                self._not_a_table()
+            self._record_count += 1
+            self._field_tags = set()
+        elif depth == 2:
+            if name in self._field_tags:
+                self._not_a_table()
+            self._field_tags.add(name)
+        elif depth > 2:
+            self._not_a_table()
+
+    def endElement(self, name: str):
+        if self.is_table:
+            depth = len(self._cur_path)
+            if depth == 2 and not self._field_tags:
+                self._not_a_table()
+            elif depth == 1 and not self._record_count:
+                self._not_a_table()
+        super().endElement(name)
+
+    def characters(self, content: str):
+        if (self.is_table and len(self._cur_path) < 3
+                and content.strip()):
+            self._not_a_table()
+        super().characters(content)
+
+
+def scan_table(filepath: Union[str, StringIO], number_cols: bool = False,
+               product: bool = False
+               ) -> Tuple[Optional[List[Tuple[str]]], bool]:
+    """
+    Find the columns and check if the document is a table in one pass.
+
+    :return: the columns (None if the document is not a table, with
+             `product`), and True if the document is a table
+    """
+    parser = make_parser()
+    handler = TableColumnsFinder(number_cols, product)
+    parser.setContentHandler(handler)
+    try:
+        parser.parse(filepath)
+    except _NotATable:
+        return None, False
+    return handler.columns(), handler.is_table
+
+
+def find_table_columns(filepath: Union[str, StringIO],
+                       number_cols: bool = False, product: bool = False
+                       ) -> Optional[List[Tuple[str]]]:
+    """
+    :return: the columns if the document is a table, None otherwise
+    """
+    columns, is_table = scan_table(filepath, number_cols, product)
+    return columns if is_table else None
+
+
+class _Slots:
+    """
+    The indices of the columns of an element, given its path.
+    """
+
+    def __init__(self, index_by_column: Dict[Tuple[str], int], path):
+        self.num = index_by_column.get(path + (NUM,))
+        self.text = index_by_column.get(path + (TEXT,))
+        self.attr_by_name = {
+            column[-1][len(ATTR):]: i for column, i in index_by_column.items()
+            if column[:-1] == path and column[-1].startswith(ATTR)}
+
+
+class TableHandler(ContentHandler):
+    """
+    Write one row per record: each value goes directly to its column. The
+    values that have no column are dropped, as in the general algorithms.
+
+    The shape is checked on the fly, since the columns may come from a
+    schema: a repeated field or a nested element raises a `ValueError`.
+    """
+
+    def __init__(self, writer, columns: List[Tuple[str]],
+                 batch_size: int = BATCH_SIZE):
+        super().__init__()
+        self._writer = writer
+        self._index_by_column = {c: i for i, c in enumerate(columns)}
+        self._batch_size = batch_size
+        self._slots_by_path: Dict[Tuple[str], _Slots] = {}
+        self._path = []
+        self._base_row = [DEFAULT] * len(columns)
+        self._row = None
+        self._rows = []
+        self._record_num = 0
+        self._text_slot = None
+        self._chars = []
+        self._field_names = set()
+
+    def _slots(self, name: str) -> _Slots:
+        self._path.append(name)
+        path = tuple(self._path)
+        try:
+            return self._slots_by_path[path]
+        except KeyError:
+            slots = _Slots(self._index_by_column, path)
+            self._slots_by_path[path] = slots
+            return slots
+
+    def startElement(self, name: str, attrs: AttributesImpl):
+        depth = len(self._path)
+        slots = self._slots(name)
+        if depth == 0:
+            row = self._base_row
+            num = 0
+        elif depth == 1:
+            self._row = row = self._base_row[:]
+            num = self._record_num
+            self._record_num += 1
+            self._field_names.clear()
+        elif depth == 2:
+            if name in self._field_names:
+                raise ValueError("Not a table: repeated field {}".format(
+                    ".".join(self._path)))
+            self._field_names.add(name)
+            row = self._row
+            num = 0
+            self._text_slot = slots.text
+            self._chars = []
+        else:
+            raise ValueError("Not a table: nested element {}".format(
+                ".".join(self._path)))
+
+        if slots.num is not None:
+            row[slots.num] = num
+
+        attr_by_name = slots.attr_by_name
+        for attr_name, value in attrs.items():
+            index = attr_by_name.get(attr_name)
+            if index is not None:
+                row[index] = value
+
+    def endElement(self, name: str):
+        depth = len(self._path)
+        if depth == 3:
+            if self._text_slot is not None:
+                text = "".join(self._chars).strip()
+                if text:
+                    self._row[self._text_slot] = text
+            self._text_slot = None
+        elif depth == 2:
+            self._rows.append(self._row)
+            if len(self._rows) >= self._batch_size:
+                self._flush()
+        else:
+            self._flush()
+        self._path.pop()
+
+    def characters(self, content: str):
+        if self._text_slot is not None:
+            self._chars.append(content)
+
+    def _flush(self):
+        self._writer.writerows(self._rows)
+        self._rows = []
+
+
+class TableFlattener:
+    """
+    A single pass converter for documents shaped like a table (see
+    `TableColumnsFinder`).
+    """
+
+    def __init__(self, filename, columns: List[Tuple[str]],
+                 short_names=False):
+        self._filename = filename
+        self._columns = columns
+        self._short_names = short_names
+
+    def flatten(self, writer):
+        writer.writerow(make_header(self._columns, self._short_names))
+        parser = make_parser()
+        parser.setContentHandler(TableHandler(writer, self._columns))
+        parser.parse(self._filename)
@@ -0,0 +1,193 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import hashlib
+import os
+import tempfile
+from typing import List, Optional
+
+TRUNCATE = "truncate"
+HASH = "hash"
+SPILL = "spill"
+TEXT_POLICIES = (TRUNCATE, HASH, SPILL)
+
+
+class _Truncated:
+    def __init__(self, max_text: int):
+        self._room = max_text
+        self._chunks: List[str] = []
+
+    def write(self, text: str):
+        if self._room > 0:
+            text = text[:self._room]
+            self._chunks.append(text)
+            self._room -= len(text)
+
+    def close(self) -> str:
+        return "".join(self._chunks)
+
+    def discard(self):
+        pass
+
+
+class _Hashed:
+    def __init__(self):
+        self._sha256 = hashlib.sha256()
+
+    def write(self, text: str):
+        self._sha256.update(text.encode("utf-8"))
+
+    def close(self) -> str:
+        return "sha256:" + self._sha256.hexdigest()
+
+    def discard(self):
+        pass
+
+
+class _Spilled:
+    def __init__(self, spill_dir: str):
+        fd, self._path = tempfile.mkstemp(".txt", "text-", spill_dir)
+        self._f = os.fdopen(fd, "w", encoding="utf-8")
+
+    def write(self, text: str):
+        self._f.write(text)
+
+    def close(self) -> str:
+        self._f.close()
+        return self._path
+
+    def discard(self):
+        self._f.close()
+        os.remove(self._path)
+
+
+class TextPolicy:
+    """
+    The handling of the texts longer than `max_text` characters (after
+    strip):
+
+    * `TRUNCATE`: the first `max_text` characters;
+    * `HASH`: `sha256:` and the SHA-256 of the text (UTF-8);
+    * `SPILL`: the text is written to a new file of `spill_dir` (a unique
+      name, never reused), and the value is the path of the file.
+
+    The shorter texts are kept as is.
+    """
+
+    def __init__(self, max_text: int, policy: str = TRUNCATE,
+                 spill_dir: Optional[str] = None):
+        if policy not in TEXT_POLICIES:
+            raise ValueError("Unknown text policy: {}".format(policy))
+        if policy == SPILL and spill_dir is None:
+            raise ValueError("A spill directory is needed")
+        self.max_text = max_text
+        self._policy = policy
+        self._spill_dir = spill_dir
+
+    def new_buffer(self) -> "TextBuffer":
+        return TextBuffer(self)
+
+    def apply(self, text: str) -> str:
+        """
+        :return: the value of a complete text, stripped
+        """
+        if len(text) <= self.max_text:
+            return text.strip()
+        buffer = TextBuffer(self)
+        buffer.append(text)
+        return buffer.pop_value()
+
+    def open_destination(self):
+        if self._policy == TRUNCATE:
+            return _Truncated(self.max_text)
+        elif self._policy == HASH:
+            return _Hashed()
+        else:
+            os.makedirs(self._spill_dir, exist_ok=True)
+            return _Spilled(self._spill_dir)
+
+
+class TextBuffer:
+    """
+    The text of an element, received chunk by chunk and stripped on the
+    fly. At most `max_text` characters are buffered: beyond, the chunks are
+    written to the destination of the policy.
+
+    A `TextBuffer` replaces the list of chunks of a `NoProductHandler`:
+    `append`, `clear` and truth value.
+    """
+
+    def __init__(self, policy: TextPolicy):
+        self._policy = policy
+        self._max_text = policy.max_text
+        self._chunks: List[str] = []
+        self._size = 0
+        self._pending = ""  # trailing whitespace: kept until a non space
+        self._started = False
+        self._destination = None
+
+    def append(self, chunk: str):
+        if not self._started:
+            chunk = chunk.lstrip()
+            if not chunk:
+                return
+            self._started = True
+        stripped = chunk.rstrip()
+        if not stripped:
+            self._pending += chunk
+            return
+        self._write(self._pending + stripped)
+        self._pending = chunk[len(stripped):]
+
+    def _write(self, text: str):
+        if self._destination is None:
+            if self._size + len(text) <= self._max_text:
+                self._chunks.append(text)
+                self._size += len(text)
+                return
+            self._destination = self._policy.open_destination()
+            for chunk in self._chunks:
+                self._destination.write(chunk)
+            self._chunks = []
+        self._destination.write(text)
+
+    def pop_value(self) -> str:
+        """
+        :return: the value of the text, and reset the buffer
+        """
+        if self._destination is None:
+            value = "".join(self._chunks)
+        else:
+            value = self._destination.close()
+            self._destination = None
+        self._reset()
+        return value
+
+    def clear(self):
+        if self._destination is not None:
+            self._destination.discard()
+            self._destination = None
+        self._reset()
+
+    def _reset(self):
+        self._chunks = []
+        self._size = 0
+        self._pending = ""
+        self._started = False
+
+    def __bool__(self) -> bool:
+        return self._started
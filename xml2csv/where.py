@@ -0,0 +1,236 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import re
+from typing import Tuple, Optional, List, Sequence
+from xml.etree import ElementTree as ET
+from xml.sax.handler import ContentHandler
+from xml.sax.xmlreader import AttributesImpl
+
+from sax import EventRecorder, NoProductHandler, NoProductFlattener
+
+EQ = "=="
+NE = "!="
+_WHERE_RE = re.compile(
+    r"""^\s*(?P<path>[^\s=!]+)\s*(?P<op>==|!=)\s*"""
+    r"""(?P<value>"[^"]*"|'[^']*'|\S+)\s*$""")
+
+
+class Predicate:
+    """
+    A test on the value of an attribute or on the text of the elements at
+    a path of a record (a child of the root). The path starts with the tag
+    of the record. A record matches if one of its elements at the path has
+    an attribute (or a stripped text) that passes the test.
+    """
+
+    def __init__(self, path: Tuple[str, ...], attr: Optional[str], op: str,
+                 value: str):
+        if op not in (EQ, NE):
+            raise ValueError("Unknown operator: {}".format(op))
+        self.path = path
+        self.attr = attr
+        self.op = op
+        self.value = value
+
+    def test(self, value: Optional[str]) -> bool:
+        if value is None:
+            return False
+        if self.op == EQ:
+            return value == self.value
+        else:
+            return value != self.value
+
+    def matches(self, record: ET.Element) -> bool:
+        """
+        :param record: a child of the root
+        :return: True if the record matches the predicate
+        """
+        if record.tag != self.path[0]:
+            return False
+        if len(self.path) == 1:
+            elements = [record]
+        else:
+            elements = record.findall("/".join(self.path[1:]))
+        for element in elements:
+            if self.attr is None:
+                value = (element.text or "").strip()
+            else:
+                value = element.get(self.attr)
+            if self.test(value):
+                return True
+        return False
+
+    def __repr__(self):
+        target = "/".join(self.path)
+        if self.attr is not None:
+            target += "/@" + self.attr
+        return "Predicate({} {} {!r})".format(target, self.op, self.value)
+
+
+def parse_where(expression: str) -> Predicate:
+    """
+    Parse `record/path/@attr == "value"` (an attribute) or
+    `record/path != value` (a text).
+    """
+    match = _WHERE_RE.match(expression)
+    if match is None:
+        raise ValueError("Invalid where expression: {}".format(expression))
+    parts = match.group("path").strip("/").split("/")
+    attr = None
+    if parts[-1].startswith("@"):
+        attr = parts.pop()[1:]
+    if not parts or not all(parts) or not attr and attr is not None:
+        raise ValueError("Invalid where path: {}".format(expression))
+    value = match.group("value")
+    if value[0] in "\"'":
+        value = value[1:-1]
+    return Predicate(tuple(parts), attr, match.group("op"), value)
+
+
+PENDING = 0
+PASS = 1
+FAIL = 2
+
+
+class WhereFilter(ContentHandler):
+    """
+    A content handler that forwards to a `NoProductHandler` the records that
+    match all the predicates. Until the decision, the events of a record
+    are recorded, not flattened; once all predicates pass, the events are
+    replayed, and the next events are forwarded. A record that fails is
+    skipped, but counted, so that the numbers are the same as without
+    filter. A record fails as soon as a test on one of its own attributes
+    fails.
+    """
+
+    def __init__(self, handler: NoProductHandler,
+                 predicates: Sequence[Predicate]):
+        super().__init__()
+        self._handler = handler
+        self._predicates = predicates
+        self._recorder = EventRecorder()
+        self._path: List[str] = []
+        self._texts: List[Optional[List[str]]] = []
+        self._text_paths = {p.path for p in predicates if p.attr is None}
+        self._status = PENDING
+        self._results: List[bool] = []
+
+    @property
+    def depth(self) -> int:
+        return self._handler.depth
+
+    def startElement(self, name: str, attrs: AttributesImpl):
+        depth = len(self._path)
+        if depth == 0:
+            self._path.append(name)
+            self._handler.startElement(name, attrs)
+            return
+        if depth == 1:
+            self._start_record()
+        self._path.append(name)
+        if self._status == FAIL:
+            return
+
+        path = tuple(self._path[1:])
+        self._texts.append([] if path in self._text_paths else None)
+        if self._status == PASS:
+            self._handler.startElement(name, attrs)
+            return
+
+        self._recorder.startElement(name, attrs)
+        for i, predicate in enumerate(self._predicates):
+            if predicate.attr is not None and predicate.path == path:
+                if predicate.test(attrs.get(predicate.attr)):
+                    self._results[i] = True
+                elif depth == 1:  # an attribute of the record: final
+                    self._status = FAIL
+                    self._texts.pop()
+                    self._recorder.clear()
+                    return
+        self._check()
+
+    def _start_record(self):
+        self._status = PENDING
+        self._results = [False] * len(self._predicates)
+        self._recorder.clear()
+
+    def _check(self):
+        if all(self._results):
+            self._status = PASS
+            self._recorder.replay(self._handler)
+            self._recorder.clear()
+
+    def endElement(self, name: str):
+        self._path.pop()
+        depth = len(self._path)
+        if depth == 0:
+            self._handler.endElement(name)
+            return
+
+        if self._status != FAIL:
+            chars = self._texts.pop()
+            if self._status == PASS:
+                self._handler.endElement(name)
+            else:
+                self._recorder.endElement(name)
+                if chars is not None:
+                    self._test_text(tuple(self._path[1:]) + (name,),
+                                    "".join(chars).strip())
+        if depth == 1:
+            if self._status != PASS:
+                self._handler.skip_element(name)
+            self._status = PENDING
+
+    def _test_text(self, path: Tuple[str, ...], text: str):
+        for i, predicate in enumerate(self._predicates):
+            if (predicate.attr is None and predicate.path == path
+                    and predicate.test(text)):
+                self._results[i] = True
+        self._check()
+
+    def characters(self, content: str):
+        depth = len(self._path)
+        if depth <= 1:
+            self._handler.characters(content)
+        elif self._status == PASS:
+            self._handler.characters(content)
+            if self._texts[-1] is not None:
+                self._texts[-1].append(content)
+        elif self._status == PENDING:
+            self._recorder.characters(content)
+            if self._texts[-1] is not None:
+                self._texts[-1].append(content)
+
+
+class FilteringFlattener(NoProductFlattener):
+    """
+    A `NoProductFlattener` that writes the records that match all the
+    predicates.
+    """
+
+    def __init__(self, filename, predicates: Sequence[Predicate],
+                 short_names=False, number_cols=False, columns=None,
+                 progress=None, text_policy=None):
+        super().__init__(filename, short_names=short_names,
+                         number_cols=number_cols, columns=columns,
+                         progress=progress, text_policy=text_policy)
+        self._predicates = predicates
+
+    def _create_handler(self, writer, columns) -> WhereFilter:
+        return WhereFilter(super()._create_handler(writer, columns),
+                           self._predicates)
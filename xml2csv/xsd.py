@@ -0,0 +1,232 @@
+#  xml2csv - Another xml2csv converter.
+#     Copyright (C) 2021 J. Férard <https://github.com/jferard>
+#
+#  This file is part of xml2csv.
+#
+#  xml2csv is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  xml2csv is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+from io import StringIO
+from typing import List, Tuple, Set, Dict, Optional, Union
+from xml.etree import ElementTree as ET
+
+from _util import TEXT, ATTR, NUM, Path
+
+XS = "{http://www.w3.org/2001/XMLSchema}"
+
+
+class CompiledSchema:
+    """
+    The columns of the documents described by a schema, in the order of
+    `find_columns`. The paths of the elements that may repeat
+    (maxOccurs > 1) decide if the documents are tables.
+    """
+
+    def __init__(self, columns: List[Tuple[str]], paths: List[Path],
+                 repeated_paths: Set[Path], optional_paths: Set[Path],
+                 text_paths: Set[Path]):
+        self.columns = columns
+        self._repeated_paths = repeated_paths
+        self._paths = paths
+        self._optional_paths = optional_paths
+        self._text_paths = text_paths
+
+    def can_repeat(self, path: Path) -> bool:
+        """
+        :return: True if the elements at this path may repeat in their
+                 parent (maxOccurs > 1): a product or an alias is needed
+        """
+        return path in self._repeated_paths
+
+    def is_table(self) -> bool:
+        """
+        :return: True if every document is a table (see
+                 `TableColumnsFinder`)
+        """
+        if not self._paths or any(len(p) > 3 for p in self._paths):
+            return False
+        records = [p for p in self._paths if len(p) == 2]
+        fields = [p for p in self._paths if len(p) == 3]
+        if len(records) != 1 or not fields:
+            return False
+        if self._paths[0] in self._text_paths or (
+                records[0] in self._text_paths):
+            return False
+        if any(self.can_repeat(p) for p in fields):
+            return False
+        return any(p not in self._optional_paths for p in fields)
+
+
+def _local(qname: str) -> str:
+    return qname.split(":")[-1]
+
+
+def _max_occurs(decl: ET.Element) -> float:
+    value = decl.get("maxOccurs", "1")
+    return float("inf") if value == "unbounded" else int(value)
+
+
+class XsdCompiler:
+    """
+    Compile an XSD to the columns of the documents. The names are the local
+    names (without namespace prefix): a schema with a target namespace is
+    rejected, since the product algorithm would see `{ns}tag` names.
+    """
+
+    def __init__(self, schema: ET.Element, number_cols: bool = False):
+        if schema.get("targetNamespace"):
+            raise ValueError("Can't compile a schema with a target namespace")
+        self._number_cols = number_cols
+        self._elements = self._globals(schema, "element")
+        self._complex_types = self._globals(schema, "complexType")
+        self._groups = self._globals(schema, "group")
+        self._attribute_groups = self._globals(schema, "attributeGroup")
+        self._attributes = self._globals(schema, "attribute")
+
+        self._paths: List[Path] = []
+        self._terminals_by_path: Dict[Path, Set[str]] = {}
+        self._repeated_paths: Set[Path] = set()
+        self._optional_paths: Set[Path] = set()
+        self._text_paths: Set[Path] = set()
+        self._stack: List[ET.Element] = []
+
+    def _globals(self, schema: ET.Element, kind: str
+                 ) -> Dict[str, ET.Element]:
+        return {decl.get("name"): decl for decl in schema.findall(XS + kind)}
+
+    def compile(self, root_name: Optional[str] = None) -> CompiledSchema:
+        if root_name is None:
+            if not self._elements:
+                raise ValueError("No global element in schema")
+            root_name = next(iter(self._elements))
+        self._element(tuple(), self._elements[root_name], False, False)
+        columns = [path + (terminal,) for path in self._paths
+                   for terminal in sorted(self._terminals_by_path[path])]
+        return CompiledSchema(columns, self._paths, self._repeated_paths,
+                              self._optional_paths, self._text_paths)
+
+    def _element(self, parent_path: Path, decl: ET.Element, repeated: bool,
+                 optional: bool):
+        repeated = repeated or _max_occurs(decl) > 1
+        optional = optional or decl.get("minOccurs", "1") == "0"
+        ref = decl.get("ref")
+        if ref is not None:
+            decl = self._elements[_local(ref)]
+        path = parent_path + (decl.get("name"),)
+        if path in self._terminals_by_path:  # declared twice
+            repeated = True
+        else:
+            self._paths.append(path)
+            self._terminals_by_path[path] = set()
+            if self._number_cols:
+                self._terminals_by_path[path].add(NUM)
+        if repeated:
+            self._repeated_paths.add(path)
+        if optional:
+            self._optional_paths.add(path)
+        if decl in self._stack:  # recursive definition
+            return
+
+        self._stack.append(decl)
+        type_name = decl.get("type")
+        complex_type = decl.find(XS + "complexType")
+        if type_name is not None and _local(type_name) in self._complex_types:
+            self._complex_type(path, self._complex_types[_local(type_name)])
+        elif complex_type is not None:
+            self._complex_type(path, complex_type)
+        else:  # simple type
+            self._add_text(path)
+        self._stack.pop()
+
+    def _complex_type(self, path: Path, decl: ET.Element):
+        if decl in self._stack:
+            return
+
+        self._stack.append(decl)
+        if decl.get("mixed") == "true":
+            self._add_text(path)
+        for child in decl:
+            if child.tag == XS + "simpleContent":
+                self._add_text(path)
+                self._content(path, child)
+            elif child.tag == XS + "complexContent":
+                if child.get("mixed") == "true":
+                    self._add_text(path)
+                self._content(path, child)
+            else:
+                self._particle_or_attribute(path, child, False, False)
+        self._stack.pop()
+
+    def _content(self, path: Path, decl: ET.Element):
+        for derivation in decl:
+            base = derivation.get("base")
+            if (derivation.tag == XS + "extension" and base is not None
+                    and _local(base) in self._complex_types):
+                self._complex_type(path, self._complex_types[_local(base)])
+            for child in derivation:
+                self._particle_or_attribute(path, child, False, False)
+
+    def _particle_or_attribute(self, path: Path, decl: ET.Element,
+                               repeated: bool, optional: bool):
+        tag = decl.tag
+        if tag == XS + "element":
+            self._element(path, decl, repeated, optional)
+        elif tag in (XS + "sequence", XS + "choice", XS + "all"):
+            repeated = repeated or _max_occurs(decl) > 1
+            optional = (optional or decl.get("minOccurs", "1") == "0"
+                        or tag == XS + "choice")
+            for child in decl:
+                self._particle_or_attribute(path, child, repeated, optional)
+        elif tag == XS + "group":
+            ref = decl.get("ref")
+            if ref is not None:
+                repeated = repeated or _max_occurs(decl) > 1
+                optional = optional or decl.get("minOccurs", "1") == "0"
+                decl = self._groups[_local(ref)]
+            for child in decl:
+                self._particle_or_attribute(path, child, repeated, optional)
+        elif tag == XS + "attribute":
+            self._attribute(path, decl)
+        elif tag == XS + "attributeGroup":
+            ref = decl.get("ref")
+            if ref is not None:
+                decl = self._attribute_groups[_local(ref)]
+            for child in decl:
+                self._particle_or_attribute(path, child, repeated, optional)
+
+    def _attribute(self, path: Path, decl: ET.Element):
+        if decl.get("use") == "prohibited":
+            return
+        name = decl.get("name")
+        if name is None:
+            ref = decl.get("ref")
+            if _local(ref) in self._attributes:
+                name = self._attributes[_local(ref)].get("name")
+            else:
+                name = ref
+        self._terminals_by_path[path].add(ATTR + name)
+
+    def _add_text(self, path: Path):
+        self._terminals_by_path[path].add(TEXT)
+        self._text_paths.add(path)
+
+
+def compile_xsd(filepath: Union[str, StringIO], number_cols: bool = False,
+                root_name: Optional[str] = None) -> CompiledSchema:
+    """
+    :param filepath: the XSD file
+    :param root_name: the name of the root element, default is the first
+                      global element
+    :return: the compiled schema
+    """
+    schema = ET.parse(filepath).getroot()
+    return XsdCompiler(schema, number_cols).compile(root_name)